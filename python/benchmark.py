@@ -0,0 +1,96 @@
+"""
+The module benchmarks the four scripts on synthetic data at several scales (medicom_synth.py).
+Each script runs in its own process with MEDICOM_DIR pointing at the synthetic directory,
+and the wall time, rows and memory of each numbered step are read back from MEDICOM_STEP_LOG (step_log.py).
+
+1. Generate the synthetic raw files of each scale
+2. Run medicom_dicom, medicom_bx, medicom_report and dicom_merge
+3. Write the step records of every scale as JSON
+
+Usage:
+    python benchmark.py --scales 1 10 100 --out benchmark.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import medicom_synth
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ['medicom_dicom', 'medicom_bx', 'medicom_report', 'dicom_merge']
+
+
+def run_scale(directory, scale, seed=0):
+    """
+    Generate the data of one scale and run the scripts on it.
+
+    Args:
+        directory (str): directory for the synthetic raw files and outputs
+        scale (float): medicom_synth scale (1 is 1,000 patients)
+        seed (int): random seed
+
+    Returns:
+        dict: rows of each raw file and the wall time, peak memory and steps of each script
+    """
+    start = time.perf_counter()
+    rows = medicom_synth.generate(directory, scale, seed)
+    result = {'scale': scale, 'rows': rows, 'generate_seconds': round(time.perf_counter() - start, 3), 'scripts': {}}
+
+    log = os.path.join(directory, 'steps.jsonl')
+    if os.path.exists(log):
+        os.remove(log)
+    env = dict(os.environ, MEDICOM_DIR=directory, MEDICOM_STEP_LOG=log)
+    for script in SCRIPTS:
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, script + '.py'], cwd=HERE, env=env, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE, text=True)
+        result['scripts'][script] = {'seconds': round(time.perf_counter() - start, 3), 'returncode': process.returncode}
+        if process.returncode != 0:
+            # Reported first: the later scripts do not run, and the script may have failed before logging any step.
+            print('%s failed at scale %g (exit code %d):\n%s' % (script, scale, process.returncode, process.stderr),
+                  file=sys.stderr)
+            result['scripts'][script]['error'] = process.stderr.strip().splitlines()[-1:]
+            break
+
+    records = []
+    if os.path.exists(log):
+        with open(log) as f:
+            records = [json.loads(line) for line in f]
+    for script, summary in result['scripts'].items():
+        steps = [record for record in records if record['module'] == script]
+        summary['steps'] = [{key: value for key, value in record.items() if key != 'module'} for record in steps]
+        summary['peak_rss_kb'] = max((record['peak_rss_kb'] or 0 for record in steps), default=None)
+    return result
+
+def print_summary(result):
+    print('scale %g: %s' % (result['scale'], ', '.join('%s %d' % (name, count) for name, count in result['rows'].items())))
+    for script, summary in result['scripts'].items():
+        print('  %-16s %8.2fs %10s KB%s' % (script, summary['seconds'], summary['peak_rss_kb'],
+                                           '  failed: %s' % ' '.join(summary['error']) if summary['returncode'] else ''))
+        for step in summary['steps']:
+            print('    %-40s %8.2fs %10s KB' % (step['step'], step['seconds'], step['peak_rss_kb']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the medicom scripts on synthetic data.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100], help='1 is 1,000 patients')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', help='working directory (default: a temporary directory per scale)')
+    parser.add_argument('--out', default='benchmark.json', help='JSON report')
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        if args.dir:
+            results.append(run_scale(os.path.join(args.dir, 'scale_%g' % scale), scale, args.seed))
+        else:
+            with tempfile.TemporaryDirectory() as directory:
+                results.append(run_scale(directory, scale, args.seed))
+        print_summary(results[-1])
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=1)
+    failed = any(summary['returncode'] for result in results for summary in result['scripts'].values())
+    sys.exit(1 if failed else 0)
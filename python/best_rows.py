@@ -0,0 +1,93 @@
+"""
+The module selects the best row per key without sorting the whole frame.
+It returns the same rows, in the same order, as `df.sort_values(by=[key] + ranks).drop_duplicates(subset=[key])`,
+but no column is sorted: the candidates of each key are narrowed one ranking column at a time with a per-key
+minimum or maximum (a hash group-by), and only the winners are taken out of the frame and ordered by their key.
+Missing values rank last in both directions, like sort_values, and ties keep the row order of a stable sort.
+
+1. Group the rows by key
+2. For each ranking column, keep the rows with the best value of their key
+3. Keep the first (or last) remaining row of each key and order the winners by key
+"""
+import numpy as np
+import pandas as pd
+
+
+def rank_values(column, ascending=True):
+    """
+    Return values whose ascending order is the sort order of the column, missing values last.
+    Numbers are used as they are; other columns are ranked with ordered categorical codes, as sort_values ranks them.
+    Columns of mixed types rank their numbers first, then the other values as text.
+
+    Args:
+        column (Series): values
+        ascending (bool): sort direction
+
+    Returns:
+        ndarray: float ranks (inf for missing values)
+    """
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        values = column.to_numpy(dtype=float)
+        values = values if ascending else -values
+        return np.where(np.isnan(values), np.inf, values)
+    if column.dtype == object and pd.api.types.infer_dtype(column, skipna=False) == 'string':
+        # Fixed-width unicode is ordered in C (by code point, like str), several times faster than Python strings.
+        codes = np.unique(column.to_numpy().astype('U'), return_inverse=True)[1].astype(float)
+        return codes if ascending else -codes
+    if column.dtype == object:
+        return _rank_mixed(column, ascending)
+    categorical = pd.Categorical(column, ordered=True)
+    codes = categorical.codes.astype(float)
+    if not ascending:
+        codes = len(categorical.categories) - 1 - codes
+    return np.where(categorical.codes == -1, np.inf, codes)
+
+def _rank_mixed(column, ascending):
+    # Mixed types (e.g. frame counts with '' for a missing tag): the numbers first in numeric order, then the other values
+    # as text, the order of the sorted categories of a mixed column. Only the distinct values are ranked, and the
+    # factorization does not sort, so values of different types are never compared.
+    codes, distinct = pd.factorize(column.to_numpy())
+    keys = [(0, float(value), '') if isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_))
+            else (1, 0.0, str(value)) for value in distinct]
+    order = {key: rank for rank, key in enumerate(sorted(set(keys)))}
+    ranks = np.array([order[key] for key in keys], dtype=float)
+    if not ascending:
+        ranks = len(order) - 1 - ranks
+    return np.append(ranks, np.inf)[codes]  # code -1 (missing) takes the last value, inf
+
+def _keep_best(keys, values, keep):
+    # keep 'first' wants the smallest rank of each key, keep 'last' the largest (missing values rank last).
+    grouped = pd.Series(values).groupby(keys, sort=False)
+    best = grouped.transform('min' if keep == 'first' else 'max').to_numpy()
+    return values == best
+
+def best_per_key(df, key, ranks, ascending=True, keep='first'):
+    """
+    Return the best row per key.
+    Same as `df.sort_values(by=[key] + ranks, ascending=ascending).drop_duplicates(subset=[key], keep=keep)`.
+
+    Args:
+        df (DataFrame): rows
+        key (str): key column
+        ranks (list): ranking columns, most significant first
+        ascending (bool or list): sort direction of the key and of each ranking column
+        keep (str): 'first' or 'last' row of each key in the sorted order
+
+    Returns:
+        DataFrame: one row per key, in the sorted order of the keys
+    """
+    if isinstance(ascending, bool):
+        ascending = [ascending] * (len(ranks) + 1)
+    if len(df) == 0:
+        return df
+    keys = pd.factorize(df[key].to_numpy(), use_na_sentinel=False)[0]  # missing keys are one group, as in drop_duplicates
+    positions = np.arange(len(df))
+
+    for column, order in zip(ranks, ascending[1:]):
+        values = rank_values(df[column].iloc[positions], order)
+        selected = _keep_best(keys[positions], values, keep)
+        positions = positions[selected]
+
+    winners = positions[~pd.Series(keys[positions]).duplicated(keep=keep).to_numpy()]
+    order = np.argsort(rank_values(df[key].iloc[winners], ascending[0]), kind='stable')
+    return df.iloc[winners[order]]
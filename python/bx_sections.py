@@ -0,0 +1,99 @@
+"""
+The module splits biopsy reports into their labeled sections without building split lists.
+Each report is lowercased once, and each section is sliced out between the first position of its header
+and the nearest header that ends it. The end is searched only up to the nearest end found so far,
+so most searches stop after the section instead of running to the end of the report.
+The headers are the labelled forms ('history:', 'recommendation:'), so the words in free text do not open a section.
+Reports with several addenda (e.g. the bx_report of medicom_bx_a2.csv) repeat the headers. By default each section is
+taken from the first addendum that has its header, like the `str.split(...).str[1]` chain it replaces (NaN if the
+report does not have it), so the pathology outcome of a later pathology addendum is still found.
+With `every`, each section is the list of its occurrences in every addendum.
+
+1. Lowercase the report
+2. Find the first header of each section (or every one)
+3. Slice the section up to the nearest header that ends it
+"""
+import numpy as np
+import pandas as pd
+
+HEADERS = ['exam:', 'accession', 'history:', 'pathology outcome section', 'outcome section:', 'pathology result section',
+           'recommendation:', 'recommendations:']
+# column -> (headers opening the section, headers that end the section)
+# exam and biopsy_result end where medicom_bx.py used to split them: exam at 'accession' (or the next 'exam:'),
+# biopsy_result at the next 'pathology' (e.g. 'pathology result section') or 'outcome section:'.
+SECTIONS = {'exam': (['exam:'], ['exam:', 'accession']),
+            'accession': (['accession'], HEADERS),
+            'history': (['history:'], HEADERS),
+            'biopsy_result': (['outcome section:'], ['outcome section:', 'pathology']),
+            'pathology_result': (['pathology result section'], HEADERS),
+            'recommendation': (['recommendation:', 'recommendations:'], HEADERS)}
+SUFFIXES = ['s', ':']  # skipped after a header without a colon, e.g. 'accession:'
+
+
+def _find(text, headers, start):
+    # Position and header of the earliest of the headers from start, (-1, None) if there is none.
+    found = (-1, None)
+    for header in headers:
+        position = text.find(header, start, found[0] if found[0] != -1 else len(text))
+        if position != -1:
+            found = (position, header)
+    return found
+
+def _section(text, position, header, ends):
+    start = position + len(header)
+    if not header.endswith(':'):
+        for suffix in SUFFIXES:
+            if text.startswith(suffix, start):
+                start += 1
+    stop = len(text)
+    for end in ends:
+        position = text.find(end, start, stop)
+        if position != -1:
+            stop = position
+    return text[start:stop].strip()
+
+def extract(report, sections, every=False):
+    """
+    Return the sections of a biopsy report.
+
+    Args:
+        report (str): biopsy report
+        sections (list): (headers, ends) of each section, values of SECTIONS
+        every (bool): return every occurrence of each section (one per addendum) instead of the first
+
+    Returns:
+        list: lowercased text of each section, NaN if the report does not have it
+            (every: list of the texts of each section, empty if the report does not have it)
+    """
+    if not isinstance(report, str):
+        return [[] if every else np.nan for _ in sections]
+    text = report.lower()
+    found = []
+    for headers, ends in sections:
+        position, header = _find(text, headers, 0)
+        if not every:
+            found.append(np.nan if position == -1 else _section(text, position, header, ends))
+            continue
+        texts = []
+        while position != -1:
+            texts.append(_section(text, position, header, ends))
+            position, header = _find(text, headers, position + len(header))
+        found.append(texts)
+    return found
+
+def extract_sections(reports, columns=None, every=False):
+    """
+    Return the sections of every biopsy report.
+    Only the requested sections are copied out of the reports, so asking for fewer columns is faster.
+
+    Args:
+        reports (Series): biopsy reports
+        columns (list): keys of SECTIONS (default: all)
+        every (bool): each cell is the list of every occurrence of the section (one per addendum) instead of the first
+
+    Returns:
+        DataFrame: one column per section, with the index of the reports
+    """
+    columns = list(SECTIONS) if columns is None else columns
+    sections = [SECTIONS[column] for column in columns]
+    return pd.DataFrame([extract(report, sections, every) for report in reports], index=reports.index, columns=columns)
@@ -0,0 +1,237 @@
+"""
+The module serves cohort queries on the merged output of dicom_merge.py from memory over localhost HTTP.
+The merged CSV is loaded once, as text like cohort_store, and every column with few distinct values gets a bitmap
+per value (one bit per row, packed with np.packbits), and the patient and study ids get the row positions of each id.
+A query ANDs the bitmaps (or ORs them for a list of values) 8 rows per byte, so it does not scan the table.
+If a reload fails (e.g. the CSV is being replaced), the previous table keeps serving and the reload is tried again.
+When a new merged CSV is published, it is loaded in the background and swapped in; queries keep using
+the previous table until the new one is ready.
+
+1. Load the merged CSV and index its columns
+2. Answer count, filter and path queries from the indexes
+3. Reload the table when the merged CSV changes
+
+Usage:
+    python cohort_service.py [--merged medicom_merged.csv] [--port 8765] [--reload-seconds 5]
+
+    curl 'localhost:8765/count?Group=A&Scan_Type=3D&Exam_type=1-index,2-pre_index&Density=C'
+    curl 'localhost:8765/filter?Group=B&columns=Patient_ID,Study_Date'
+    curl 'localhost:8765/paths?Patient_ID=0199437cceea1ba69a9add803c64e639'
+    curl 'localhost:8765/reload'
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pandas as pd
+import medicom_paths
+
+MERGED_CSV = medicom_paths.BASE_DIR + '/medicom_merged.csv'
+KEY_COLUMNS = ['Patient_ID', 'Study_Instance_UID']  # indexed by row positions
+BITMAP_LIMIT = 256  # columns with at most this many distinct values get a bitmap per value
+PATH_COLUMNS = ['Patient_ID', 'Study_Instance_UID', 'Scan_Type', 'LCC_Path', 'LMLO_Path', 'RCC_Path', 'RMLO_Path']
+PORT = 8765
+
+
+class CohortTable:
+    """
+    The merged rows and their column indexes. A table is never changed after it is built, so it can be shared by threads.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.signature = file_signature(path)
+        self.rows = pd.read_csv(path, encoding='utf-8-sig', index_col=0, dtype=str, keep_default_na=False).reset_index(drop=True)
+        self.bitmaps = {}
+        self.positions = {}
+        for column in self.rows.columns:
+            if column in KEY_COLUMNS:
+                self.positions[column] = self.rows.groupby(column, sort=False).indices
+            elif self.rows[column].nunique() <= BITMAP_LIMIT:
+                codes, values = pd.factorize(self.rows[column])
+                self.bitmaps[column] = {value: np.packbits(codes == code) for code, value in enumerate(values)}
+
+    def mask(self, filters):
+        """
+        Return the rows that match every filter.
+
+        Args:
+            filters (dict): column -> list of values (a row matches one of the values)
+
+        Returns:
+            ndarray: bool mask of the rows
+        """
+        return np.unpackbits(self.bitmap(filters), count=len(self.rows)).astype(bool)
+
+    def bitmap(self, filters):
+        """
+        Return the rows that match every filter as a bitmap (np.packbits of the bool mask).
+        """
+        rows = len(self.rows)
+        bitmap = np.packbits(np.ones(rows, dtype=bool))
+        for column, values in filters.items():
+            if column not in self.rows.columns:
+                raise KeyError(column)
+            if column in self.bitmaps:
+                empty = np.zeros_like(bitmap)
+                matched = np.bitwise_or.reduce([self.bitmaps[column].get(value, empty) for value in values])
+            elif column in self.positions:
+                hits = np.zeros(rows, dtype=bool)
+                for value in values:
+                    hits[self.positions[column].get(value, [])] = True
+                matched = np.packbits(hits)
+            else:  # a column with many distinct values (e.g. a path) is scanned
+                matched = np.packbits(self.rows[column].isin(values).to_numpy())
+            bitmap &= matched
+        return bitmap
+
+    def count(self, filters):
+        return int(np.unpackbits(self.bitmap(filters)).sum())  # the padding bits of the last byte are 0
+
+    def select(self, filters, columns=None):
+        return self.rows.loc[self.mask(filters), columns or list(self.rows.columns)]
+
+
+def file_signature(path):
+    status = os.stat(path)
+    return status.st_mtime_ns, status.st_size
+
+def parse_query(query):
+    """
+    Split a query string into filters and options.
+    A value with commas is a list of values (e.g. Exam_type=1-index,2-pre_index).
+
+    Returns:
+        tuple: filters (column -> list of values), columns (list or None)
+    """
+    filters = {}
+    columns = None
+    for name, values in parse_qs(query, keep_blank_values=True).items():
+        values = [item for value in values for item in value.split(',')]
+        if name == 'columns':
+            columns = values
+        else:
+            filters[name] = values
+    return filters, columns
+
+
+class CohortService:
+    """
+    Holds the current table and reloads it when the merged CSV changes.
+    """
+    def __init__(self, path, reload_seconds=5):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.table = CohortTable(path)
+        self.lock = threading.Lock()  # one reload at a time
+
+    def reload(self, force=False):
+        """
+        Load the merged CSV again if it changed and swap in the new table.
+
+        Returns:
+            bool: True if the table was reloaded
+        """
+        with self.lock:
+            if not force and file_signature(self.path) == self.table.signature:
+                return False
+            self.table = CohortTable(self.path)  # queries use the previous table until the assignment
+            return True
+
+    def watch(self):
+        # dicom_merge writes the CSV in place, so a change is loaded only once the file stopped changing for one interval.
+        # A failed load (a CSV still being written or replaced) keeps the previous table and is retried at the next check.
+        previous = self.table.signature
+        while True:
+            time.sleep(self.reload_seconds)
+            try:
+                current = file_signature(self.path)
+            except FileNotFoundError:
+                continue
+            if current == previous and current != self.table.signature:
+                try:
+                    self.reload()
+                except Exception as error:
+                    print('reload of %s failed, serving the previous table: %r' % (self.path, error), file=sys.stderr)
+            previous = current
+
+    def answer(self, route, query):
+        """
+        Answer a query.
+
+        Args:
+            route (str): 'count', 'filter', 'paths' or 'reload'
+            query (str): URL query string of the filters
+
+        Returns:
+            dict: JSON response
+        """
+        table = self.table
+        filters, columns = parse_query(query)
+        if route == 'count':
+            return {'count': table.count(filters)}
+        if route == 'filter':
+            rows = table.select(filters, columns)
+            return {'count': len(rows), 'rows': rows.to_dict('records')}
+        if route == 'paths':
+            rows = table.select(filters, PATH_COLUMNS)
+            return {'count': len(rows), 'rows': rows.to_dict('records')}
+        if route == 'reload':
+            return {'reloaded': self.reload(force=True), 'rows': len(self.table.rows)}
+        raise LookupError(route)
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                status, response = 200, service.answer(url.path.strip('/'), url.query)
+            except LookupError as error:  # unknown route or column
+                status, response = 404, {'error': 'not found: %s' % error}
+            except Exception as error:  # e.g. /reload of a CSV being written: the previous table keeps serving
+                status, response = 503, {'error': '%s: %s' % (type(error).__name__, error)}
+            body = json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+def serve(path=MERGED_CSV, port=PORT, reload_seconds=5):
+    """
+    Serve cohort queries on localhost until interrupted.
+
+    Args:
+        path (str): merged CSV
+        port (int): localhost port
+        reload_seconds (float): interval of the checks for a new merged CSV (0: no automatic reload)
+    """
+    service = CohortService(path, reload_seconds)
+    if reload_seconds > 0:
+        threading.Thread(target=service.watch, daemon=True).start()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(service))
+    print('serving %d rows of %s on http://127.0.0.1:%d' % (len(service.table.rows), path, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve cohort queries on the merged output from memory.')
+    parser.add_argument('--merged', default=MERGED_CSV, help='merged CSV of dicom_merge.py')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--reload-seconds', type=float, default=5, help='check interval for a new merged CSV (0: off)')
+    args = parser.parse_args()
+    serve(args.merged, args.port, args.reload_seconds)
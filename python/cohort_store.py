@@ -0,0 +1,120 @@
+"""
+The module keeps the merged output of dicom_merge.py in an indexed SQLite store for cohort selection.
+The rows are stored as the text of the merged CSV, so a selection returns the same values as reading the CSV,
+but a query on the indexed columns is an index lookup instead of a scan of the whole file.
+An incremental merge refreshes the store in place: only the rows of the merged patients are replaced.
+
+1. Write the merged rows (all of them, or only the rows of the merged patients) in one transaction
+2. Index the cohort columns
+3. Select a cohort with equality (or IN) filters on any columns
+
+Usage:
+    python cohort_store.py <store path> Group=A Scan_Type=3D Exam_type=2-pre_index Density=C [--count] [--columns LCC_Path RCC_Path]
+"""
+import argparse
+import os
+import sqlite3
+import pandas as pd
+
+TABLE = 'merged'
+INDEXED_COLUMNS = ['Patient_ID', 'Study_Instance_UID', 'Group', 'Scan_Type', 'Exam_type', 'index_interval_category']
+# Row order of the merged CSV: group, then patient id + '_' + scan type (merge_rules.pid_scan_type), then the order of the rows
+# of one patient, which are inserted together. rowid alone is not enough: a refresh appends the replaced rows at the end.
+ORDER = '"Group", "Patient_ID" || \'_\' || "Scan_Type", rowid'
+
+
+def _quote(column):
+    return '"%s"' % column.replace('"', '""')
+
+def _create(connection, columns):
+    definitions = ', '.join('%s TEXT' % _quote(column) for column in columns)
+    connection.execute('DROP TABLE IF EXISTS %s' % TABLE)
+    connection.execute('CREATE TABLE %s (%s)' % (TABLE, definitions))
+
+def _index(connection, columns):
+    for column in INDEXED_COLUMNS:
+        if column in columns:
+            connection.execute('CREATE INDEX %s ON %s (%s)' % (_quote('idx_' + column), TABLE, _quote(column)))
+
+def _columns(connection):
+    return [row[1] for row in connection.execute('PRAGMA table_info(%s)' % TABLE)]
+
+def write_store(merged_csv, path, patients=None):
+    """
+    Write the rows of the merged CSV to a store.
+
+    Args:
+        merged_csv (str): merged output of dicom_merge.py
+        path (str): SQLite file
+        patients (set): if given, only the rows of these patients are replaced in an existing store (incremental merge)
+    """
+    rows = pd.read_csv(merged_csv, encoding='utf-8-sig', index_col=0, dtype=str, keep_default_na=False)
+    connection = sqlite3.connect(path, isolation_level=None)
+    try:
+        with connection:
+            connection.execute('BEGIN')  # one transaction, the table included: readers see the old or the new rows
+            refresh = patients is not None and _columns(connection) == list(rows.columns)
+            if refresh:
+                connection.executemany('DELETE FROM %s WHERE "Patient_ID" = ?' % TABLE, [(patient,) for patient in patients])
+                rows = rows.loc[rows['Patient_ID'].isin(patients)]
+            else:
+                _create(connection, list(rows.columns))
+            placeholders = ', '.join('?' * len(rows.columns))
+            connection.executemany('INSERT INTO %s VALUES (%s)' % (TABLE, placeholders), rows.itertuples(index=False, name=None))
+            if not refresh:
+                _index(connection, list(rows.columns))  # building the indexes after the rows is faster than updating them
+    finally:
+        connection.close()
+
+def select(path, filters=None, columns=None, count=False):
+    """
+    Select a cohort from a store.
+
+    Args:
+        path (str): SQLite file
+        filters (dict): column -> value, or list of values (e.g. {'Group': 'A', 'Exam_type': ['1-index', '2-pre_index']})
+        columns (list): columns to return (default: all)
+        count (bool): if True, return only the number of rows
+
+    Returns:
+        DataFrame or int: selected rows in the order of the merged CSV, or their number
+    """
+    conditions, values = [], []
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            conditions.append('%s IN (%s)' % (_quote(column), ', '.join('?' * len(value))))
+            values += [str(v) for v in value]
+        else:
+            conditions.append('%s = ?' % _quote(column))
+            values.append(str(value))
+    where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    connection = sqlite3.connect('file:%s?mode=ro' % path, uri=True)
+    try:
+        if count:
+            return connection.execute('SELECT COUNT(*) FROM %s%s' % (TABLE, where), values).fetchone()[0]
+        selected = ', '.join(_quote(column) for column in columns) if columns else '*'
+        return pd.read_sql_query('SELECT %s FROM %s%s ORDER BY %s' % (selected, TABLE, where, ORDER), connection, params=values)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Select a cohort from the merged cohort store.')
+    parser.add_argument('path', help='SQLite store written by dicom_merge.py')
+    parser.add_argument('filters', nargs='*', help='column=value (values separated by commas are matched with IN)')
+    parser.add_argument('--columns', nargs='+', help='columns to print')
+    parser.add_argument('--count', action='store_true', help='print only the number of rows')
+    args = parser.parse_args()
+
+    filters = {}
+    for item in args.filters:
+        column, value = item.split('=', 1)
+        filters[column] = value.split(',') if ',' in value else value
+    if args.count:
+        print(select(args.path, filters, count=True))
+    else:
+        print(select(args.path, filters, args.columns).to_csv(index=False), end='')
@@ -0,0 +1,225 @@
+"""
+The module classifies the dicommeta information column by column.
+It returns the same values as the row-wise `get` functions it replaced (kept as the reference of test_dicom_classify.py),
+but every rule is evaluated on a whole column with vectorized string masks and numeric parsing.
+If it cannot find the requested feature, it returns an empty string('')
+
+1. Parse the group from the file path
+2. Parse the scan type from the number of frames and series description
+3. Parse the view type from the series description, laterality, view position and plane orientation
+4. Map the view type to the 4-view type and view priority
+5. Sum the rows and columns
+"""
+import numpy as np
+import pandas as pd
+import rule_profile
+
+GROUPS = ['A', 'B', 'C', 'D']
+VIEWS = ['XCCL', 'XCCM', 'CC', 'MLO', 'LMO', 'ML', 'LM']
+FOUR_VIEWS = {'LCC': 'LCC|LXCCL|LXCCM',
+              'RCC': 'RCC|RXCCL|RXCCM',
+              'LMLO': 'LMLO|LLM|LML|LLMO',
+              'RMLO': 'RMLO|RLM|RML|RLMO'}
+FIRST_VIEWS = 'LCC|RCC|LMLO|RMLO'
+
+
+def _text(column):
+    return column.astype(str)
+
+def _contains(column, pattern):
+    return column.str.contains(pattern, regex=False).fillna(False).to_numpy(dtype=bool)
+
+def parse_int(column):
+    """
+    Parse a column the way `int()` parses a single value.
+    Values that `int()` rejects (e.g. '' or '3.0') become NaN.
+
+    Args:
+        column (Series): numbers or strings
+
+    Returns:
+        Series: float values truncated toward zero, NaN if not parsable
+    """
+    numeric = pd.to_numeric(column, errors='coerce')
+    is_text = column.map(type).eq(str)
+    if is_text.any():
+        integral = _text(column).str.strip().str.fullmatch(r'[+-]?\d+').fillna(False).astype(bool)
+        numeric = numeric.mask(is_text & ~integral)
+    return np.trunc(numeric.astype(float))
+
+def parse_plane_orientation(column):
+    """
+    Parse the 'Plane Orientation' column into a numeric array in one pass.
+    Replaces calling `ast.literal_eval` on every row (e.g. "['1', '0', '0', '0', '0', '-1']").
+
+    Args:
+        column (Series): plane orientation strings
+
+    Returns:
+        ndarray: float array of shape (rows, values), NaN if empty or not parsable
+    """
+    text = _text(column).str.replace("'", '', regex=False).str.strip('[]() ')
+    parts = text.str.split(',', expand=True)
+    if parts.shape[1] < 4:
+        parts = parts.reindex(columns=range(4))
+    parts = parts.apply(lambda part: pd.to_numeric(part.str.strip(), errors='coerce'))
+    return parts.to_numpy(dtype=float)
+
+def get_groups(df):
+    """
+    Return group information
+
+    Args:
+        df (DataFrame): dicom meta
+
+    Returns:
+        ndarray: a single letter group name or '' per row
+    """
+    path = _text(df['Path'])
+    conditions = [_contains(path, 'Group ' + group) for group in GROUPS]
+    return np.select(conditions, GROUPS, default='')
+
+def get_scan_types(df):
+    """
+    Return the dicom's scan type(e.g. 3D, S2D or 2D)
+
+    Args:
+        df (DataFrame): dicom meta
+
+    Returns:
+        ndarray: scan type per row
+    """
+    num_frame = parse_int(df['Number of Frames']).fillna(0).to_numpy()
+    series_description = _text(df['Series_Description'])
+    lower = series_description.str.lower()
+    conditions = [num_frame > 1,
+                  _contains(lower, 'tomosynthesis') | _contains(series_description, 'ROUTINE3D_VOL'),
+                  _contains(lower, 'preview') | _contains(lower, 'c-view'),
+                  ((df['Window Center'] == '') | (df['Window Width'] == '')).to_numpy(dtype=bool)]
+    return np.select(conditions, ['3D', '3D', 'S2D', 'unused'], default='2D')
+
+def get_preview_view_types(df):
+    """
+    Return the view type of V-Preview rows from the plane orientation.
+
+    Args:
+        df (DataFrame): dicom meta (V-Preview rows)
+
+    Returns:
+        ndarray: view type per row(e.g. LMLO) or ''
+    """
+    orientation = parse_plane_orientation(df['Plane Orientation'])
+    laterality = np.where(np.trunc(orientation[:, 1]) == 1, 'R', 'L')
+    position = np.abs(orientation[:, 3])
+    view_position = np.select([position >= 0.9, position < 0.9],
+                              ['CC', 'MLO'],
+                              default=_text(df['View Position']).to_numpy(dtype=object))
+    view_type = np.char.add(laterality, view_position.astype(str)).astype(object)
+    empty = (_text(df['Plane Orientation']).str.replace("'", '', regex=False) == '').to_numpy()
+    view_type[empty | (position > 1.0)] = ''
+    return view_type
+
+def get_view_types(df):
+    """
+    Return the view type(e.g. RCC). The view is searched in the series description first,
+    then the view position of 2D_PROC files, then the plane orientation of V-Preview files.
+
+    Args:
+        df (DataFrame): dicom meta
+
+    Returns:
+        ndarray: view type per row(e.g. LMLO) or ''
+    """
+    series_description = _text(df['Series_Description'])
+    laterality = _text(df['Image Laterality']).to_numpy(dtype=object)
+    view_type = np.full(len(df), '', dtype=object)
+    unresolved = ~_contains(series_description, '_R2')
+
+    for view in VIEWS:
+        found = unresolved & _contains(series_description, view)
+        view_type[found] = laterality[found] + view
+        unresolved &= ~found
+
+    found = unresolved & _contains(series_description, '2D_PROC')
+    view_type[found] = laterality[found] + _text(df['View Position']).to_numpy(dtype=object)[found]
+    unresolved &= ~found
+
+    found = unresolved & _contains(series_description, 'V-Preview')
+    if found.any():
+        view_type[found] = get_preview_view_types(df.loc[found])
+    return view_type
+
+def _lookup(view_type, rule):
+    codes, uniques = pd.factorize(pd.Series(view_type, dtype=object))
+    table = np.array([rule(view) for view in uniques] + [rule('')], dtype=object)
+    return table[codes]
+
+def _four_view(view_type):
+    if view_type == '':
+        return None
+    for four_view, views in FOUR_VIEWS.items():
+        if view_type in views:
+            return four_view
+    return ''
+
+def _view_priority(view_type):
+    if view_type == '':
+        return np.nan
+    return 2 if view_type in FIRST_VIEWS else 1
+
+def inter_view_types(view_type):
+    """
+    Return the 4-view type. Each distinct view type is classified once and mapped back to the rows.
+
+    Args:
+        view_type (array-like): view type per row
+
+    Returns:
+        ndarray: the 4-view type per row, None if the view type is ''
+    """
+    return _lookup(view_type, _four_view)
+
+def get_view_priorities(view_type):
+    """
+    Returns the view priority.
+    Standard 4-view(2) takes precedence over additional view(1).
+
+    Args:
+        view_type (array-like): view type per row
+
+    Returns:
+        ndarray: 1.0, 2.0 or NaN per row
+    """
+    return _lookup(view_type, _view_priority).astype(float)
+
+def sum_rows_columns(df):
+    """
+    Return Sum of the Rows and Columns values.
+
+    Args:
+        df (DataFrame): dicom meta
+
+    Returns:
+        Series: sum of Rows and Columns (e.g. 4016), NaN if either one is empty
+    """
+    valid = (df['Rows'] != '') & (df['Columns'] != '')
+    return (parse_int(df['Rows']) + parse_int(df['Columns'])).where(valid)
+
+def classify_views(df):
+    """
+    Create the group, scan_type, view_type, 4view_type, view_priority and resolution columns.
+
+    Args:
+        df (DataFrame): dicom meta
+
+    Returns:
+        DataFrame: dicom meta with the new columns
+    """
+    df = df.copy()
+    df['group'] = rule_profile.call(get_groups, df)
+    df['scan_type'] = rule_profile.call(get_scan_types, df)
+    df['view_type'] = rule_profile.call(get_view_types, df)
+    df['4view_type'] = rule_profile.call(inter_view_types, df['view_type'])
+    df['view_priority'] = rule_profile.call(get_view_priorities, df['view_type'])
+    df['resolution'] = rule_profile.call(sum_rows_columns, df)
+    return df
@@ -0,0 +1,155 @@
+"""
+The module builds the dicommeta table directly from the DICOM files under a directory.
+Only the header of each file is read (reading stops before the pixel data), and the files are read
+on a thread pool so the I/O of many files overlaps. The columns are the ones of the dicom meta export
+read by medicom_dicom.py (and the Image Orientation (Patient)), so the table can go straight into the classification.
+If a tag is missing, the column is an empty string('')
+A file that cannot be read (not a DICOM file, truncated or malformed) is reported with its path on stderr and skipped.
+pydicom is only needed when a directory is crawled.
+
+1. Walk the directory tree
+2. Read the header tags of each file on a thread pool
+3. Return the meta table, whole or in chunks
+"""
+import os
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# export column -> DICOM keyword
+TAGS = {'Patient_ID': 'PatientID',
+        'Study_Instance_UID': 'StudyInstanceUID',
+        'Manufacturer': 'Manufacturer',
+        'Manufacturer_Model_Name': 'ManufacturerModelName',
+        'Study_Date': 'StudyDate',
+        'Study_Description': 'StudyDescription',
+        'Patient_Sex': 'PatientSex',
+        'Patient_Birth_Date': 'PatientBirthDate',
+        'SOP Instance UID': 'SOPInstanceUID',
+        'Frame of Reference UID': 'FrameOfReferenceUID',
+        'Series_Description': 'SeriesDescription',
+        'Number of Frames': 'NumberOfFrames',
+        'Image Laterality': 'ImageLaterality',
+        'View Position': 'ViewPosition',
+        'Rows': 'Rows',
+        'Columns': 'Columns',
+        'Window Center': 'WindowCenter',
+        'Window Width': 'WindowWidth',
+        'Presentation Intent Type': 'PresentationIntentType',
+        'Estimated Radiographic Magnification Factor': 'EstimatedRadiographicMagnificationFactor',
+        'Breast Implant Present': 'BreastImplantPresent',
+        'Image Orientation Patient': 'ImageOrientationPatient'}
+SEQUENCES = ['ViewCodeSequence', 'SharedFunctionalGroupsSequence']
+COLUMNS = list(TAGS) + ['View Modifier Code Sequence Meaning', 'Plane Orientation', 'Path']
+
+
+def _value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (int, float, str)):
+        return value
+    if hasattr(value, '__iter__'):  # multi-valued tag, e.g. several window centers
+        return '\\'.join(str(item) for item in value)
+    return str(value)
+
+def _first(dataset, *keywords):
+    for keyword in keywords:
+        items = dataset.get(keyword) if dataset is not None else None
+        dataset = items[0] if items else None
+    return dataset
+
+def get_plane_orientation(dataset):
+    """
+    Return the plane orientation in the format of the export (e.g. "['0', '1', '0', '0', '0', '-1']").
+    The shared functional group of multi-frame files is searched first, then the Image Orientation (Patient).
+
+    Args:
+        dataset (Dataset): dicom header
+
+    Returns:
+        str: plane orientation or ''
+    """
+    plane = _first(dataset, 'SharedFunctionalGroupsSequence', 'PlaneOrientationSequence')
+    orientation = plane.get('ImageOrientationPatient') if plane is not None else None
+    if orientation is None:
+        orientation = dataset.get('ImageOrientationPatient')
+    if orientation is None:
+        return ''
+    return str([str(value) for value in orientation])
+
+def read_header(path):
+    """
+    Return the meta row of a DICOM file.
+
+    Args:
+        path (str): file path
+
+    Returns:
+        dict: export column -> value, None if the file cannot be read (reported on stderr)
+    """
+    import pydicom
+    from pydicom.errors import BytesLengthException, InvalidDicomError
+
+    # The values are decoded when they are accessed, so a malformed element fails while the row is built, not in dcmread.
+    try:
+        dataset = pydicom.dcmread(path, stop_before_pixels=True, defer_size='4 KB',
+                                  specific_tags=list(TAGS.values()) + SEQUENCES)
+        row = {column: _value(dataset.get(keyword)) for column, keyword in TAGS.items()}
+        modifier = _first(dataset, 'ViewCodeSequence', 'ViewModifierCodeSequence')
+        row['View Modifier Code Sequence Meaning'] = _value(modifier.get('CodeMeaning')) if modifier is not None else ''
+        row['Plane Orientation'] = get_plane_orientation(dataset)
+    except (InvalidDicomError, BytesLengthException, OSError, EOFError, ValueError, TypeError, KeyError, struct.error) as error:
+        print('skipped %s: %s: %s' % (path, type(error).__name__, error), file=sys.stderr)
+        return None
+    row['Path'] = path
+    return row
+
+def find_files(root):
+    """
+    Return every file under the directory, in a stable order.
+    """
+    for directory, directories, files in os.walk(root):
+        directories.sort()
+        for name in sorted(files):
+            yield os.path.join(directory, name)
+
+def crawl_chunks(root, chunksize=10000, workers=16):
+    """
+    Yield the meta table of the DICOM files under the directory, `chunksize` files at a time.
+    Files that cannot be read are skipped (read_header).
+
+    Args:
+        root (str): directory
+        chunksize (int): number of files per chunk
+        workers (int): number of reading threads
+
+    Yields:
+        DataFrame: meta table chunk with the export columns
+    """
+    files = find_files(root)
+    start = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            paths = [path for _, path in zip(range(chunksize), files)]
+            if not paths:
+                break
+            rows = [row for row in pool.map(read_header, paths) if row is not None]
+            yield pd.DataFrame(rows, columns=COLUMNS, index=range(start, start + len(rows)))
+            start += len(rows)
+
+def read_meta(root, workers=16):
+    """
+    Return the meta table of all DICOM files under the directory.
+
+    Args:
+        root (str): directory
+        workers (int): number of reading threads
+
+    Returns:
+        DataFrame: meta table with the export columns
+    """
+    chunks = list(crawl_chunks(root, workers=workers))
+    if not chunks:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,99 @@
+"""
+The module parses dicom meta exports split into shards (e.g. one CSV per disk) as a map-reduce.
+Each shard is parsed in its own worker process: the outliers are removed, the dicom tags are classified and
+only the best 4-view file per `duplication` of the shard is kept (dicom_stream). The reduce step selects the best
+file per `duplication` again across the shard winners, so a study split over several disks is resolved globally.
+The result is the same as parsing the shards concatenated in the given order; memory grows with the winners, not the shards.
+
+1. Map: parse each shard and keep its best 4-view file per duplication
+2. Reduce: keep the best 4-view file per duplication across the shards
+"""
+import glob
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import dicom_stream
+import stage_io
+
+
+def shard_paths(shards):
+    """
+    Return the shard files.
+
+    Args:
+        shards (str or list): glob pattern (e.g. RAW_DIR + '/medicom_dm_*.csv', sorted by name) or list of CSV paths
+
+    Returns:
+        list: CSV paths in the order of the reduce
+    """
+    if isinstance(shards, str):
+        return sorted(glob.glob(shards))
+    return list(shards)
+
+def map_shard(path, chunksize=None):
+    """
+    Parse one shard and return its best 4-view file per `duplication`.
+
+    Args:
+        path (str): dicom meta CSV of the shard
+        chunksize (int): if set, the shard is streamed CHUNKSIZE rows at a time
+
+    Returns:
+        tuple: one file per duplication with the KEEP_COLUMNS of dicom_stream (indexed by row of the shard),
+            number of rows of the shard
+    """
+    rows = [0]
+    def counted(chunks):
+        for chunk in chunks:
+            rows[0] += len(chunk)
+            yield chunk
+    chunks = stage_io.read_input(path, 'dicom_meta', chunksize) if chunksize else [stage_io.read_input(path, 'dicom_meta')]
+    best = dicom_stream.best_views(counted(chunks))
+    return best, rows[0]
+
+def reduce_shards(results):
+    """
+    Keep the best 4-view file per `duplication` across the shard winners.
+    The rows are indexed by their row in the shards concatenated in order, and ties keep the file of the last shard,
+    like the last file of one concatenated export.
+
+    Args:
+        results (list): map_shard results in shard order
+
+    Returns:
+        DataFrame: one file per duplication with the KEEP_COLUMNS of dicom_stream
+    """
+    winners = []
+    offset = 0
+    for best, rows in results:
+        if len(best):
+            winners.append(best.set_axis(best.index + offset))
+        offset += rows
+    if not winners:
+        return pd.DataFrame(columns=dicom_stream.KEEP_COLUMNS)
+    return dicom_stream.select_best_views(pd.concat(winners))[dicom_stream.KEEP_COLUMNS]
+
+def best_views(shards, workers, chunksize=None):
+    """
+    Return the best 4-view file per `duplication` of sharded dicom meta exports.
+
+    Args:
+        shards (str or list): glob pattern or list of shard CSVs (shard_paths)
+        workers (int): number of processes (1: the shards are parsed one after another in this process)
+        chunksize (int): if set, each shard is streamed CHUNKSIZE rows at a time
+
+    Returns:
+        DataFrame: one file per duplication with the KEEP_COLUMNS of dicom_stream
+    """
+    paths = shard_paths(shards)
+    if not paths:
+        raise FileNotFoundError('no dicom meta shards: %s' % (shards,))
+    #1. Map: parse each shard and keep its best 4-view file per duplication
+    if workers > 1 and len(paths) > 1:
+        # The platform's default start method: under spawn the workers import this module (and the main script) again,
+        # so the scripts keep their work under `if __name__ == '__main__'`.
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            results = list(pool.map(map_shard, paths, [chunksize] * len(paths)))
+    else:
+        results = [map_shard(path, chunksize) for path in paths]
+    #2. Reduce: keep the best 4-view file per duplication across the shards
+    return reduce_shards(results)
@@ -0,0 +1,104 @@
+"""
+The module reads the dicommeta CSV in bounded-size chunks.
+The outlier filter and the classification are applied to each chunk as soon as it is read,
+and only the best 4-view file per `duplication` is kept across chunks.
+Peak memory is bounded by the chunk size plus the surviving rows, not by the raw export size.
+
+1. Remove the outliers of each chunk
+2. Parse dicom tags of the remaining rows
+3. Merge the chunk into the best 4-view file per study, scan type, 4-view type and model
+"""
+import pandas as pd
+import best_rows
+import dicom_classify
+import stage_io
+
+# Columns used by step 3 of medicom_dicom.py and its output. Other columns are dropped after each chunk.
+KEEP_COLUMNS = ['Patient_ID',
+                'Study_Instance_UID',
+                'Manufacturer',
+                'Manufacturer_Model_Name',
+                'Study_Date',
+                'Patient_Sex',
+                'Patient_Birth_Date',
+                'SOP Instance UID',
+                'Frame of Reference UID',
+                'Path',
+                'Number of Frames',
+                'group',
+                'scan_type',
+                'view_type',
+                '4view_type',
+                'view_priority',
+                'duplication']
+
+
+def remove_outliers(df):
+    """
+    Remove male patients, FOR PROCESSING files, magnified views, implants and STEREOTACTIC/SPECIMEN studies.
+
+    Args:
+        df (DataFrame): dicom meta (empty values filled with '')
+
+    Returns:
+        DataFrame: dicom meta without the outliers
+    """
+    magnification = pd.to_numeric(df['Estimated Radiographic Magnification Factor'].replace('', 0), errors='coerce')
+    return df.loc[(df['View Modifier Code Sequence Meaning'] == '') &
+                  (df['Patient_Sex'] != 'M') &
+                  (df['Presentation Intent Type'] != 'FOR PROCESSING') &
+                  (magnification < 1.5) &
+                  (df['Breast Implant Present'] != 'YES') &
+                  (df['Study_Description'].astype(str).str.contains('STEREOTACTIC|SPECIMEN') != True)]
+
+def select_best_views(df):
+    """
+    Select the best 4-view file per `duplication` (study, scan type, 4-view type and model).
+    The standard view wins over the additional view, then the file with more frames.
+    Rows keep their original order among ties, so the last file of the export wins as before.
+
+    Args:
+        df (DataFrame): classified dicom meta
+
+    Returns:
+        DataFrame: one file per duplication
+    """
+    df = df.loc[(df['view_type'] != '') & (df['4view_type'] != '')].copy()
+    df['duplication'] = df['Study_Instance_UID'].astype(str) + "_" + df['scan_type'] + "_" + df['4view_type'] + '_' + df['Manufacturer_Model_Name']
+    return best_rows.best_per_key(df, 'duplication', ['view_priority', 'Number of Frames'], keep='last')
+
+def read_best_views(path, chunksize):
+    """
+    Stream the dicom meta CSV and return the best 4-view file per `duplication`.
+
+    Args:
+        path (str): dicom meta CSV
+        chunksize (int): number of rows read at a time
+
+    Returns:
+        DataFrame: one file per duplication with the KEEP_COLUMNS
+    """
+    return best_views(stage_io.read_input(path, 'dicom_meta', chunksize))
+
+def best_views(chunks):
+    """
+    Return the best 4-view file per `duplication` of a stream of dicom meta chunks.
+
+    Args:
+        chunks (iterable): dicom meta DataFrames (e.g. CSV chunks or dicom_crawl.crawl_chunks)
+
+    Returns:
+        DataFrame: one file per duplication with the KEEP_COLUMNS
+    """
+    best = None
+    for chunk in chunks:
+        #1. Remove the outliers of each chunk
+        chunk = remove_outliers(chunk.fillna(''))
+        #2. Parse dicom tags of the remaining rows
+        chunk = dicom_classify.classify_views(chunk)
+        #3. Merge the chunk into the best 4-view file per duplication
+        chunk = select_best_views(chunk)[KEEP_COLUMNS]
+        best = chunk if best is None else select_best_views(pd.concat([best, chunk]))[KEEP_COLUMNS]
+    if best is None:
+        return pd.DataFrame(columns=KEEP_COLUMNS)
+    return best
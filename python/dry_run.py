@@ -0,0 +1,141 @@
+"""
+The module runs the whole pipeline on a sample of the patients, to try a rule change (e.g. in get_view_types or
+devide_accept_reject) in seconds, and projects the counts of the merged output to the whole cohort.
+The sample is stratified by group: in each group (the group of the first file of the patient) the same fraction of
+the patients is kept, those with the smallest hash of their id, so the same patients are sampled on every run.
+The patients are sampled from the id columns of the dicom meta table, and only the rows of the sampled patients
+(and of their studies, for the radiology reports) are parsed from the raw exports: the meta rows by their position
+in that first pass, the other exports after a pass over their id column. The stages run in one process (medicom_api). Every rule depends only on the rows of one patient,
+so the sampled rows are the ones the full run would produce for those patients.
+The counts of the merged rows per group and exam type, and per group and study label, are projected with the
+stratified estimator and a 95% normal confidence interval, with patients as sampling units.
+Nothing is written but a temporary report store (and the parse caches, if set).
+
+1. Sample the patients of each group
+2. Read the rows of the sampled patients from every raw export
+3. Run the stages on the sample
+4. Project the counts to the whole cohort
+
+Usage:
+    python dry_run.py [--fraction 0.05] [--seed 0]
+"""
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+import dicom_classify
+import medicom_api
+import medicom_bx
+import medicom_dicom
+import medicom_report
+import stage_io
+
+FRACTION = 0.05  # share of the patients of each group
+DIMENSIONS = ['Exam_type', 'study_label']  # merged columns counted per group
+Z = 1.96  # 95% normal confidence interval
+PATIENT_COLUMNS = {'bx': 'patientId', 'bx_2': 'Patient_ID', 'bx_ge': 'Patient ID'}  # patient id per raw export
+
+
+def sample_patients(meta_csv, fraction, seed=0):
+    """
+    Sample the same fraction of the patients of each group, deterministically.
+
+    Args:
+        meta_csv (str): dicom meta CSV
+        fraction (float): share of the patients of each group (at least one patient per group)
+        seed (int): changes the sampled patients
+
+    Returns:
+        tuple: Series of the group of each sampled patient (indexed by Patient_ID),
+            Series of the number of patients per group in the cohort,
+            set of the Study_Instance_UIDs of the sampled patients,
+            set of the rows of the sampled patients in the meta CSV (positions, for stage_io.read_input)
+    """
+    ids = pd.read_csv(meta_csv, encoding='utf-8-sig', usecols=['Patient_ID', 'Study_Instance_UID', 'Path'], dtype=str)
+    ids['group'] = dicom_classify.get_groups(ids.fillna(''))
+    patients = ids.drop_duplicates('Patient_ID').dropna(subset=['Patient_ID'])
+    patients = patients.assign(rank=pd.util.hash_pandas_object(patients['Patient_ID'], index=False,
+                                                                 hash_key='%016d' % seed).to_numpy())
+    population = patients.groupby('group').size()
+    sizes = np.maximum(1, np.round(population * fraction)).astype(int)
+    patients = patients.sort_values(['group', 'rank'])
+    patients = patients.loc[patients.groupby('group').cumcount().to_numpy() < sizes.reindex(patients['group']).to_numpy()]
+    strata = patients.set_index('Patient_ID')['group']
+    sampled = ids['Patient_ID'].isin(strata.index)
+    studies = set(ids.loc[sampled, 'Study_Instance_UID'].dropna())
+    return strata, population, studies, set(ids.index[sampled])
+
+def project(merged, strata, population):
+    """
+    Project the counts of the merged rows of the sample to the whole cohort.
+    Each patient counts its rows per (Group, value); the total is the sum over the groups of the stratum size times the
+    mean per sampled patient, and its variance the sum of N^2 (1 - n/N) s^2 / n (s^2: variance per patient of the stratum).
+
+    Args:
+        merged (DataFrame): merged output of the sample
+        strata (Series): group of each sampled patient (sample_patients)
+        population (Series): number of patients per group in the cohort
+
+    Returns:
+        DataFrame: Group, dimension, value, rows in the sample, projected rows and the bounds of the interval
+    """
+    stratum = strata.to_numpy()
+    counted = population.reindex(strata.unique())
+    sampled = strata.value_counts().reindex(counted.index)
+    results = []
+    for dimension in DIMENSIONS:
+        keys = [merged['Patient_ID'].astype(str), merged['Group'], merged[dimension]]
+        per_patient = merged.groupby(keys).size().unstack(['Group', dimension], fill_value=0)
+        per_patient = per_patient.reindex(strata.index, fill_value=0)  # sampled patients without merged rows count 0
+        mean = per_patient.groupby(stratum).mean()
+        variance = per_patient.groupby(stratum).var(ddof=1).fillna(0)  # a stratum of one patient adds no variance
+        total = mean.mul(counted, axis=0).sum()
+        spread = variance.mul(counted ** 2 * (1 - sampled / counted) / sampled, axis=0).sum()
+        margin = Z * np.sqrt(spread)
+        for (group, value), projected in total.items():
+            results.append({'Group': group, 'dimension': dimension, 'value': value,
+                            'sample_rows': int(per_patient[(group, value)].sum()), 'projected': round(projected, 1),
+                            'low': round(max(projected - margin[(group, value)], 0), 1),
+                            'high': round(projected + margin[(group, value)], 1)})
+    results = pd.DataFrame(results, columns=['Group', 'dimension', 'value', 'sample_rows', 'projected', 'low', 'high'])
+    return results.sort_values(['dimension', 'Group', 'value'], key=lambda column: column.astype(str)).reset_index(drop=True)
+
+def dry_run(fraction=FRACTION, seed=0):
+    """
+    Run the pipeline on a stratified sample of the patients and project the merged counts.
+
+    Args:
+        fraction (float): share of the patients of each group
+        seed (int): changes the sampled patients
+
+    Returns:
+        tuple: merged output of the sample, projected counts (project)
+    """
+    #1. Sample the patients of each group
+    strata, population, studies, rows = sample_patients(medicom_dicom.META_CSV, fraction, seed)
+    patients = set(strata.index)
+
+    #2. Read the rows of the sampled patients from every raw export
+    meta = stage_io.read_input(medicom_dicom.META_CSV, 'dicom_meta', rows=rows)
+    biopsy = [stage_io.read_input_rows(path, source, PATIENT_COLUMNS[source], patients) for path, source in medicom_bx.INPUT_FILES]
+    report = stage_io.read_input_rows(medicom_report.INPUT_CSV, 'reports', 'Study_Instance_UID', studies)
+
+    #3. Run the stages on the sample
+    with tempfile.TemporaryDirectory() as directory:
+        dicom = medicom_api.parse_dicom(meta)
+        biopsy_lt, biopsy_rt = medicom_api.parse_biopsy(biopsy)
+        report = medicom_api.parse_report(report, store=directory + '/medicom_report_texts')
+        merged = medicom_api.merge(dicom, biopsy_lt, biopsy_rt, report)
+
+    #4. Project the counts to the whole cohort
+    return merged, project(merged, strata, population)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the pipeline on a stratified sample of the patients and project the counts.')
+    parser.add_argument('--fraction', type=float, default=FRACTION, help='share of the patients of each group')
+    parser.add_argument('--seed', type=int, default=0, help='changes the sampled patients')
+    args = parser.parse_args()
+    merged, projection = dry_run(args.fraction, args.seed)
+    print('%d merged rows from the sample' % len(merged))
+    print(projection.to_string(index=False))
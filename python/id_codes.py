@@ -0,0 +1,46 @@
+"""
+The module pivots the file paths of dicom_merge.py step 1 on integer codes instead of identifier strings.
+The keys, the 4-view types and the paths are interned into int codes (one dictionary each), the first path of each
+(key, 4-view type) pair is found on the codes, and the new columns are decoded from the path dictionary,
+so they refer to the path strings already loaded instead of copies grouped by pivot_table.
+
+1. Encode the keys, the new column names and the values
+2. Find the first value of each (key, column) pair on the codes
+3. Spread the values into one column per column name, for every row
+"""
+import numpy as np
+import pandas as pd
+
+
+def pivot_codes(keys, columns, values):
+    """
+    Spread the first non-missing value of each (key, column) pair into one column per column value, for every row.
+    Same values as `pd.merge(df, pd.pivot_table(df, index=key, columns=column, values=value, aggfunc='first'), on=key, how='left')`.
+
+    Args:
+        keys (Series): key per row (e.g. unique_id)
+        columns (Series): new column name per row (e.g. 4view_type)
+        values (Series): value per row (e.g. Path)
+
+    Returns:
+        DataFrame: one row per input row (same index), one column per column value (sorted); missing pairs are NaN
+    """
+    #1. Encode the keys, the new column names and the values
+    valid = (keys.notna() & columns.notna() & values.notna()).to_numpy()
+    key_codes, key_values = pd.factorize(keys.to_numpy())
+    column_codes, names = pd.factorize(columns.to_numpy()[valid], sort=True)
+    value_codes, dictionary = pd.factorize(values.to_numpy()[valid])
+
+    #2. Find the first value of each (key, column) pair on the codes
+    pairs = key_codes[valid].astype(np.int64) * len(names) + column_codes
+    pairs, first = np.unique(pairs, return_index=True)
+    table = np.full((len(key_values), len(names)), -1, dtype=np.int64)
+    table[pairs // len(names), pairs % len(names)] = value_codes[first]
+
+    #3. Spread the values into one column per column name, for every row
+    dictionary = np.append(np.asarray(dictionary, dtype=object), np.nan)  # code -1 decodes to NaN
+    spread = {}
+    for position, name in enumerate(names):
+        codes = np.where(key_codes >= 0, table[key_codes, position], -1)
+        spread[name] = dictionary[codes]
+    return pd.DataFrame(spread, index=keys.index)
@@ -0,0 +1,135 @@
+"""
+The module runs the pipeline in one process: dicom -> bx -> report -> merge, with the outputs of each stage kept in memory.
+Each stage function takes and returns DataFrames, so the stages can also be called one by one (e.g. from a notebook).
+The outputs are passed to the merge as `stage_io.pass_stage` types them, which is what the merge reads from the typed
+Feather copies, so no CSV is written and parsed again between the stages.
+Importing the module reads no file and imports no third-party package: a stage module (and pandas) is imported
+when the stage first runs. The flags of the stage modules (e.g. medicom_bx.PARSE_CACHE) still apply.
+
+1. Parse the dicom meta table (medicom_dicom)
+2. Parse the biopsy reports (medicom_bx)
+3. Parse the radiology reports (medicom_report)
+4. Merge the parsed tables (dicom_merge)
+
+Usage:
+    import medicom_api
+    outputs = medicom_api.run()             # DataFrames of every stage, nothing written but the report store
+    merged = outputs['merged']
+
+    python medicom_api.py [--write]         # run in one process, --write: also write the CSVs of the scripts
+"""
+import argparse
+
+
+def parse_dicom(meta=None):
+    """
+    Parse the dicom meta table.
+
+    Args:
+        meta (DataFrame): raw dicom meta table. If None, it is read as medicom_dicom.py reads it
+
+    Returns:
+        DataFrame: parsed dicom meta (medicom_dicom_parsed.csv)
+    """
+    import medicom_dicom
+    return medicom_dicom.parse_meta(meta)
+
+def parse_biopsy(inputs=None):
+    """
+    Parse the biopsy reports.
+
+    Args:
+        inputs (list): df_a, df_a2, df_b, df_b2, df_ge. If None, they are read as medicom_bx.py reads them
+
+    Returns:
+        tuple: left and right biopsy results (medicom_biopsy_parsed_lt.csv, medicom_biopsy_parsed_rt.csv)
+    """
+    import medicom_bx
+    return medicom_bx.parse_biopsy(*(medicom_bx.read_inputs() if inputs is None else inputs))
+
+def parse_report(report=None, store=None):
+    """
+    Parse the radiology reports. The report texts are written to the report store.
+
+    Args:
+        report (DataFrame): radiology reports. If None, they are read as medicom_report.py reads them
+        store (str): report store (default: medicom_report.REPORT_STORE)
+
+    Returns:
+        DataFrame: parsed reports (medicom_report_parsed.csv)
+    """
+    import medicom_report
+    return medicom_report.parse_report(medicom_report.read_inputs() if report is None else report, store)
+
+def merge(dicom, biopsy_lt, biopsy_rt, report, workers=None):
+    """
+    Merge the outputs of the three parsing stages.
+
+    Args:
+        dicom (DataFrame): output of parse_dicom
+        biopsy_lt, biopsy_rt (DataFrame): output of parse_biopsy
+        report (DataFrame): output of parse_report
+        workers (int): processes of the merge steps 5-7 (default: dicom_merge.WORKERS)
+
+    Returns:
+        DataFrame: merged studies (medicom_merged.csv)
+    """
+    import dicom_merge
+    import stage_io
+    return dicom_merge.merge(stage_io.pass_stage(dicom, 'dicom', dicom_merge.DICOM_COLUMNS, categorical=False),
+                             stage_io.pass_stage(biopsy_lt, 'biopsy_lt', dicom_merge.BIOPSY_LT_COLUMNS, categorical=False),
+                             stage_io.pass_stage(biopsy_rt, 'biopsy_rt', dicom_merge.BIOPSY_RT_COLUMNS, categorical=False),
+                             stage_io.pass_stage(report, 'report', dicom_merge.REPORT_COLUMNS, categorical=False),
+                             workers)
+
+def write(outputs):
+    """
+    Write the outputs of `run` where the scripts write them (CSVs, and the Feather copies if the stage flags ask for them).
+
+    Args:
+        outputs (dict): output of run
+    """
+    import dicom_merge
+    import medicom_bx
+    import medicom_dicom
+    import medicom_report
+    import stage_io
+    stage_io.write_stage(outputs['dicom'], medicom_dicom.PARSED_CSV, 'dicom', feather=medicom_dicom.FEATHER)
+    stage_io.write_stage(outputs['biopsy_lt'], medicom_bx.PARSED_LT_CSV, 'biopsy_lt', feather=medicom_bx.FEATHER)
+    stage_io.write_stage(outputs['biopsy_rt'], medicom_bx.PARSED_RT_CSV, 'biopsy_rt', feather=medicom_bx.FEATHER)
+    stage_io.write_stage(outputs['report'], medicom_report.PARSED_CSV, 'report', feather=medicom_report.FEATHER)
+    outputs['merged'].to_csv(dicom_merge.MERGED_CSV)
+
+def run():
+    """
+    Run the four stages in this process.
+
+    Returns:
+        dict: 'dicom', 'biopsy_lt', 'biopsy_rt', 'report' and 'merged' DataFrames
+    """
+    import step_log
+    outputs = {}
+    #1. Parse the dicom meta table (medicom_dicom)
+    outputs['dicom'] = parse_dicom()
+    step_log.finish('medicom_dicom', outputs['dicom'])
+    #2. Parse the biopsy reports (medicom_bx)
+    outputs['biopsy_lt'], outputs['biopsy_rt'] = parse_biopsy()
+    step_log.finish('medicom_bx', [outputs['biopsy_lt'], outputs['biopsy_rt']])
+    #3. Parse the radiology reports (medicom_report)
+    outputs['report'] = parse_report()
+    step_log.finish('medicom_report', outputs['report'])
+    #4. Merge the parsed tables (dicom_merge)
+    outputs['merged'] = merge(outputs['dicom'], outputs['biopsy_lt'], outputs['biopsy_rt'], outputs['report'])
+    step_log.finish('dicom_merge', outputs['merged'])
+    return outputs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the medicom pipeline in one process.')
+    parser.add_argument('--write', action='store_true', help='write the CSVs of the scripts')
+    args = parser.parse_args()
+    outputs = run()
+    if args.write:
+        write(outputs)
+    for name, df in outputs.items():
+        print('%-10s %8d rows' % (name, len(df)))
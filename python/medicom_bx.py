@@ -7,12 +7,25 @@ The module joins 5 biopsy files and parses the biopsy report to get the biopsy r
 4. Sort biopsy results of the left and right breasts in severe order and select the most severe biopsy results as the final label of each breast
 """
 import pandas as pd
+import best_rows
+import bx_sections
+import medicom_paths
+import parse_cache
+import rule_profile
+import stage_io
+import step_log
+
+FEATHER = False  # If True, typed Feather copies are written next to the parsed CSVs (stage_io)
+PARSE_CACHE = None  # If set (e.g. medicom_paths.BASE_DIR + '/.parse_cache_bx.sqlite'), parsed report sections are cached there by report text (parse_cache)
+ARROW = False  # If True, the 5 biopsy files are read at the same time with the multithreaded Arrow CSV reader (stage_io)
+INPUT_FILES = [(medicom_paths.RAW_DIR + '/medicom_bx_a.csv', 'bx'),
+               (medicom_paths.RAW_DIR + '/medicom_bx_a2.csv', 'bx_2'),
+               (medicom_paths.RAW_DIR + '/medicom_bx_b.csv', 'bx'),
+               (medicom_paths.RAW_DIR + '/medicom_bx_b2.csv', 'bx_2'),
+               (medicom_paths.RAW_DIR + '/medicom_bx_ge.csv', 'bx_ge')]  # (path, stage_io source) of df_a, df_a2, df_b, df_b2, df_ge
+PARSED_LT_CSV = medicom_paths.BASE_DIR + '/medicom_biopsy_parsed_lt.csv'
+PARSED_RT_CSV = medicom_paths.BASE_DIR + '/medicom_biopsy_parsed_rt.csv'
 
-df_a = pd.read_csv('/Users/lunit/Documents/medicom_script_202107/raw_file/medicom_bx_a.csv', encoding='utf-8-sig', low_memory=False)
-df_a2 = pd.read_csv("/Users/lunit/Documents/medicom_script_202107/raw_file/medicom_bx_a2.csv", encoding='utf-8-sig', low_memory=False)
-df_b = pd.read_csv('/Users/lunit/Documents/medicom_script_202107/raw_file/medicom_bx_b.csv', encoding='utf-8-sig', low_memory=False)
-df_b2 = pd.read_csv('/Users/lunit/Documents/medicom_script_202107/raw_file/medicom_bx_b2.csv', encoding='utf-8-sig', low_memory=False)
-df_ge = pd.read_csv('/Users/lunit/Documents/medicom_script_202107/raw_file/medicom_bx_ge.csv', encoding='utf-8-sig', low_memory=False)
 
 def get_biopsy_side(biopsy):
     """
@@ -98,33 +111,87 @@ def get_right_label(biopsy):
     else:
         return ''
 
-#1. Rename columns to join 5 Biopsy files into 1 file
-df_a2 = df_a2.rename(columns={'bx_report':'reports','Patient_ID':'patientId', 'Representative_Study_Instance_UID':'studyUID'})
-df_b2 = df_b2.rename(columns={'bx_report':'reports','Patient_ID':'patientId', 'Representative_Study_Instance_UID':'studyUID'})
-df_ge = df_ge.rename(columns={'Patient ID':'patientId','Index Exam Study UID': 'studyUID'})
-
-#2. Join 5 biopsy files
-biopsy = pd.concat([df_a, df_a2, df_b, df_b2, df_ge])
-biopsy = biopsy.fillna('')
-
-#3. Parse biopsy reports to get the biopsy label (biopsy side, left breast label, right breast label)
-biopsy['exam'] = biopsy.reports.str.lower().str.split('exam:').str[1].str.split('accession').str[0].str.strip()
-biopsy['biopsy_result'] = biopsy.reports.str.lower().str.split('outcome section:').str[1].str.split('pathology').str[0].str.strip()
-biopsy['biopsy_side'] = biopsy.apply(get_biopsy_side, axis=1)
-biopsy['left_label'] = biopsy.apply(get_left_label, axis=1)
-biopsy['right_label'] = biopsy.apply(get_right_label, axis=1)
-biopsy = biopsy[['patientId', 'studyUID', 'completedDate', 'reports','Biopsy Finding (Negative, Benign, Malignant)', 'biopsy_result', 'biopsy_side','left_label', 'right_label']]
-
-#4. Sort biopsy results of the left and right breasts in severe order and select the most severe biopsy results as the final label of each breast
-biopsy_lt = biopsy.sort_values(by=['patientId','left_label','completedDate'], ascending=False).fillna('')
-biopsy_lt = biopsy_lt[biopsy_lt['left_label'].str.contains('malignant|high risk|benign')].drop_duplicates(subset=['patientId'], keep='first')
-biopsy_lt = biopsy_lt.rename(columns={'completedDate' : 'lt_bx_date', 'biopsy_side' : 'biopsy_side_lt'})
-biopsy_lt = biopsy_lt[['patientId', 'lt_bx_date', 'biopsy_side_lt','left_label']]
-
-biopsy_rt = biopsy.sort_values(by=['patientId','right_label','completedDate'], ascending=False).fillna('')
-biopsy_rt = biopsy_rt[biopsy_rt['right_label'].str.contains('malignant|high risk|benign')].drop_duplicates(subset=['patientId'], keep='first')
-biopsy_rt = biopsy_rt.rename(columns={'completedDate' : 'rt_bx_date', 'biopsy_side' : 'biopsy_side_rt'})
-biopsy_rt = biopsy_rt[['patientId', 'rt_bx_date', 'biopsy_side_rt','right_label']]
-
-biopsy_lt.to_csv('/Users/lunit/Documents/medicom_script_202107/medicom_biopsy_parsed_lt.csv')
-biopsy_rt.to_csv('/Users/lunit/Documents/medicom_script_202107/medicom_biopsy_parsed_rt.csv')
+def parse_reports(reports):
+    """
+    Return the exam and biopsy result sections and the biopsy side of each report.
+    The side is the one `get_biopsy_side` finds in the text alone; a row without one falls back to 'ge_unknown'
+    if it has a GE biopsy finding, exactly where `get_biopsy_side` reaches its GE branch.
+
+    Args:
+        reports (Series): biopsy reports
+
+    Returns:
+        DataFrame: 'exam', 'biopsy_result' and 'biopsy_side' columns with the index of the reports
+    """
+    parsed = rule_profile.call(bx_sections.extract_sections, reports, ['exam', 'biopsy_result'], count=False)
+    parsed['biopsy_side'] = rule_profile.apply(parsed.assign(**{'Biopsy Finding (Negative, Benign, Malignant)': ''}), get_biopsy_side)
+    return parsed
+
+def read_inputs(arrow=None):
+    """
+    Read the 5 biopsy files (INPUT_FILES).
+
+    Args:
+        arrow (bool): read them with the Arrow CSV reader (default: ARROW)
+
+    Returns:
+        list: df_a, df_a2, df_b, df_b2, df_ge
+    """
+    step_log.mark('medicom_bx', '0. Load')
+    return stage_io.read_inputs(INPUT_FILES, arrow=ARROW if arrow is None else arrow)
+
+def parse_biopsy(df_a, df_a2, df_b, df_b2, df_ge):
+    """
+    Join the 5 biopsy files and select the most severe biopsy result of each breast per patient: steps 1-4.
+
+    Args:
+        df_a, df_b (DataFrame): medicom_bx_a.csv and medicom_bx_b.csv (columns of stage_io.INPUTS['bx'])
+        df_a2, df_b2 (DataFrame): medicom_bx_a2.csv and medicom_bx_b2.csv (stage_io.INPUTS['bx_2'])
+        df_ge (DataFrame): medicom_bx_ge.csv (stage_io.INPUTS['bx_ge'])
+
+    Returns:
+        tuple: left and right biopsy results (the columns of medicom_biopsy_parsed_lt.csv and medicom_biopsy_parsed_rt.csv)
+    """
+    #1. Rename columns to join 5 Biopsy files into 1 file
+    step_log.mark('medicom_bx', '1. Rename columns', [df_a, df_a2, df_b, df_b2, df_ge])
+    df_a2 = df_a2.rename(columns={'bx_report':'reports','Patient_ID':'patientId', 'Representative_Study_Instance_UID':'studyUID'})
+    df_b2 = df_b2.rename(columns={'bx_report':'reports','Patient_ID':'patientId', 'Representative_Study_Instance_UID':'studyUID'})
+    df_ge = df_ge.rename(columns={'Patient ID':'patientId','Index Exam Study UID': 'studyUID'})
+
+    #2. Join 5 biopsy files
+    step_log.mark('medicom_bx', '2. Join biopsy files', [df_a, df_a2, df_b, df_b2, df_ge])
+    biopsy = pd.concat([df_a, df_a2, df_b, df_b2, df_ge])
+    biopsy = biopsy.fillna('')
+
+    #3. Parse biopsy reports to get the biopsy label (biopsy side, left breast label, right breast label)
+    step_log.mark('medicom_bx', '3. Parse biopsy reports', biopsy)
+    #   (each distinct report is parsed once, and only if it is not in the parse cache yet)
+    parsed = parse_cache.parse_cached(biopsy['reports'], parse_reports, 'biopsy', parse_cache.version(bx_sections, get_biopsy_side, parse_reports), PARSE_CACHE)
+    biopsy['exam'] = parsed['exam']
+    biopsy['biopsy_result'] = parsed['biopsy_result']
+    ge_unknown = (parsed['biopsy_side'] == '') & (biopsy['Biopsy Finding (Negative, Benign, Malignant)'] != '')
+    biopsy['biopsy_side'] = parsed['biopsy_side'].mask(ge_unknown, 'ge_unknown')
+    biopsy['left_label'] = rule_profile.apply(biopsy, get_left_label)
+    biopsy['right_label'] = rule_profile.apply(biopsy, get_right_label)
+    biopsy = biopsy[['patientId', 'studyUID', 'completedDate','Biopsy Finding (Negative, Benign, Malignant)', 'biopsy_result', 'biopsy_side','left_label', 'right_label']]
+
+    #4. Sort biopsy results of the left and right breasts in severe order and select the most severe biopsy results as the final label of each breast
+    step_log.mark('medicom_bx', '4. Select most severe labels', biopsy)
+    biopsy_lt = biopsy[biopsy['left_label'].fillna('').str.contains('malignant|high risk|benign')]
+    biopsy_lt = best_rows.best_per_key(biopsy_lt, 'patientId', ['left_label', 'completedDate'], ascending=False).fillna('')
+    biopsy_lt = biopsy_lt.rename(columns={'completedDate' : 'lt_bx_date', 'biopsy_side' : 'biopsy_side_lt'})
+    biopsy_lt = biopsy_lt[['patientId', 'lt_bx_date', 'biopsy_side_lt','left_label']]
+
+    biopsy_rt = biopsy[biopsy['right_label'].fillna('').str.contains('malignant|high risk|benign')]
+    biopsy_rt = best_rows.best_per_key(biopsy_rt, 'patientId', ['right_label', 'completedDate'], ascending=False).fillna('')
+    biopsy_rt = biopsy_rt.rename(columns={'completedDate' : 'rt_bx_date', 'biopsy_side' : 'biopsy_side_rt'})
+    biopsy_rt = biopsy_rt[['patientId', 'rt_bx_date', 'biopsy_side_rt','right_label']]
+    return biopsy_lt, biopsy_rt
+
+
+if __name__ == '__main__':
+    biopsy_lt, biopsy_rt = parse_biopsy(*read_inputs())
+    step_log.mark('medicom_bx', 'Write', [biopsy_lt, biopsy_rt])
+    stage_io.write_stage(biopsy_lt, PARSED_LT_CSV, 'biopsy_lt', feather=FEATHER)
+    stage_io.write_stage(biopsy_rt, PARSED_RT_CSV, 'biopsy_rt', feather=FEATHER)
+    step_log.finish('medicom_bx', [biopsy_lt, biopsy_rt])
@@ -0,0 +1,11 @@
+"""
+The module holds the directories read and written by the pipeline scripts.
+The MEDICOM_DIR environment variable overrides the default directory (e.g. to run the benchmark on synthetic data).
+
+BASE_DIR: parsed and merged files
+RAW_DIR: raw exports (dicom meta, biopsy and radiology reports)
+"""
+import os
+
+BASE_DIR = os.environ.get('MEDICOM_DIR', '/Users/lunit/Documents/medicom_script_202107')
+RAW_DIR = os.path.join(BASE_DIR, 'raw_file')
@@ -3,10 +3,24 @@ The module parses the radiology report to get density and birads category.
 
 1. Create new columns 'density' and 'birads'
 2. Drop duplicated reports and remove unused columns
+3. Move the report texts to the report store and keep the report id and the 'mammo' flag (report_store)
 """
 import pandas as pd
+import best_rows
+import medicom_paths
+import parse_cache
+import report_match
+import report_store
+import rule_profile
+import stage_io
+import step_log
 
-report = pd.read_csv('/Users/lunit/Documents/medicom_script_202107/raw_file/medicom_reports.csv', encoding='utf-8-sig')
+FEATHER = False  # If True, a typed Feather copy is written next to the parsed CSV (stage_io)
+ARROW = False  # If True, the reports are read with the multithreaded Arrow CSV reader into Arrow-backed strings (stage_io)
+PARSE_CACHE = None  # If set (e.g. medicom_paths.BASE_DIR + '/.parse_cache_report.sqlite'), parsed density and birads are cached there by report text (parse_cache)
+REPORT_STORE = medicom_paths.BASE_DIR + '/medicom_report_texts'  # report texts, read back by report_id (report_store)
+INPUT_CSV = medicom_paths.RAW_DIR + '/medicom_reports.csv'
+PARSED_CSV = medicom_paths.BASE_DIR + '/medicom_report_parsed.csv'
 
 
 def get_density(report):
@@ -69,15 +83,67 @@ def select(report):
     else:
         return 'reject'
 
-#1. Create new columns 'density' and 'birads'
-report['density'] = report.apply(get_density, axis=1)
-report['birads'] = report.apply(get_birads, axis=1)
-report['select'] = report.apply(select, axis=1)
+def read_inputs(arrow=None):
+    """
+    Read the radiology reports (INPUT_CSV).
 
-#2. Drop duplicated reports and remove unused columns
-report = report.loc[report['select'] == 'accept']
-report = report.sort_values(by=['Study_Instance_UID','birads', 'density'], ascending=False)
-report = report.drop_duplicates(subset=['Study_Instance_UID'], keep='first')
-report = report[['Study_Instance_UID', 'reports', 'birads', 'density']]
+    Args:
+        arrow (bool): read them with the Arrow CSV reader (default: ARROW)
 
-report.to_csv('/Users/lunit/Documents/medicom_script_202107/medicom_report_parsed.csv')
+    Returns:
+        DataFrame: reports
+    """
+    step_log.mark('medicom_report', '0. Load')
+    report, = stage_io.read_inputs([(INPUT_CSV, 'reports')], arrow=ARROW if arrow is None else arrow)
+    return report
+
+def parse_reports(reports):
+    """
+    Return the density and birads of each report (report_match).
+
+    Args:
+        reports (Series): radiology reports
+
+    Returns:
+        DataFrame: 'density' and 'birads' columns with the index of the reports
+    """
+    return rule_profile.call(report_match.parse_reports, reports)
+
+def parse_report(report, store=None):
+    """
+    Parse density and birads and keep the best accepted report per study: steps 1-3.
+
+    Args:
+        report (DataFrame): radiology reports (columns of stage_io.INPUTS['reports'])
+        store (str): report store the texts are written to (default: REPORT_STORE)
+
+    Returns:
+        DataFrame: the columns of medicom_report_parsed.csv
+    """
+    #1. Create new columns 'density' and 'birads'
+    step_log.mark('medicom_report', '1. Parse density and birads', report)
+    report = report.copy(deep=False)  # the new columns are not added to the caller's frame
+    matches = parse_cache.parse_cached(report['reports'], parse_reports, 'report', parse_cache.version(report_match, parse_reports), PARSE_CACHE)
+    report['density'] = matches['density']
+    report['birads'] = matches['birads']
+    report['select'] = rule_profile.apply(report, select)
+
+    #2. Drop duplicated reports and remove unused columns
+    step_log.mark('medicom_report', '2. Drop duplicated reports', report)
+    report = report.loc[report['select'] == 'accept']
+    report = best_rows.best_per_key(report, 'Study_Instance_UID', ['birads', 'density'], ascending=False)
+    report = report[['Study_Instance_UID', 'reports', 'birads', 'density']]
+
+    #3. Move the report texts to the report store and keep the report id and the 'mammo' flag
+    step_log.mark('medicom_report', '3. Store report texts', report)
+    report = report.assign(report_id=report_store.write_store(report['reports'], store or REPORT_STORE),
+                           mammo=report['reports'].str.lower().str.contains('mammo', regex=False).fillna(False))
+    report = report[['Study_Instance_UID', 'report_id', 'mammo', 'birads', 'density']]
+    return report
+
+
+if __name__ == '__main__':
+    report = parse_report(read_inputs())
+    step_log.mark('medicom_report', 'Write', report)
+    stage_io.write_stage(report, PARSED_CSV, 'report', feather=FEATHER)
+    step_log.finish('medicom_report', report)
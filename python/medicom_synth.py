@@ -0,0 +1,246 @@
+"""
+The module generates a synthetic raw_file directory shaped like the real exports, for benchmarks.
+Scale 1 is 1,000 patients (about 40,000 dicom meta rows). Patients are generated in blocks,
+so scale 1000 is written without holding the whole cohort in memory.
+
+1. Draw patients (group, manufacturer), their studies, scans and views
+2. Write the dicom meta export with outliers, V-Preview and 2D_PROC rows
+3. Write the radiology reports with density and birads sentences
+4. Write the five biopsy files (a/b, a2/b2 and GE formats) for group A and B patients
+
+Usage:
+    python medicom_synth.py <directory> [--scale 10] [--seed 0]
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+PATIENTS_PER_SCALE = 1000
+BLOCK = 20000  # patients per block
+
+GROUPS = np.array(['A', 'B', 'C', 'D'], dtype=object)
+MODELS = np.array([('HOLOGIC, Inc.', 'Selenia Dimensions'), ('GE MEDICAL SYSTEMS', 'Senographe Pristina')])
+VIEWS = np.array(['L CC', 'R CC', 'L MLO', 'R MLO'], dtype=object)
+EXTRA_VIEWS = np.array(['L XCCL', 'R XCCL', 'L ML', 'R LM', 'L CC_R2'], dtype=object)
+ORIENTATIONS = np.array(["['0', '1', '0', '0', '0', '-1']", "['0', '-1', '0', '0.95', '0', '-1']",
+                         "['0', '1', '0', '-0.5', '0', '-1']", "['0', '-1', '0', '0.7', '0', '-1']"], dtype=object)
+DENSITIES = np.array(['The breasts are almost entirely fatty.',
+                      'There are scattered fibroglandular densities.',
+                      'The breast parenchyma is heterogeneously dense which may obscure small masses.',
+                      'The breasts are extremely dense, which lowers the sensitivity of mammography.',
+                      ''], dtype=object)
+BIRADS = np.array(['ASSESSMENT: BIRADS: 1 - Negative.', 'ASSESSMENT: BIRADS: 2 - Benign.',
+                   'ASSESSMENT: BIRADS: 0 - Incomplete. Needs additional imaging.', 'BI-RADS Category 3: Probably benign.',
+                   'ASSESSMENT: BIRADS: 4A - Low suspicion for malignancy.', 'ASSESSMENT: BIRADS: 5 - Highly suggestive of malignancy.',
+                   'Overall: - Negative', ''], dtype=object)
+FILLER = ('COMPARISON: [DATE], SCREENING MAMMOGRAM, performed at [ADDRESS].    TECHNIQUE: Bilateral 2D screening digital '
+          'mammography with 3D breast tomosynthesis was performed and compared.    FINDINGS: There is no evidence of dominant mass, '
+          'skin thickening, nipple retraction or pathologic clustered microcalcifications.    COMMENTS: Digital mammography was '
+          'performed according to the [ADDRESS] of Radiology standards. In compliance with MQSA regulations and ACR guidelines, '
+          'a letter stating the findings of this exam is being sent to your patient.    ')
+PROCEDURE = ('PROCEDURE DESCRIPTION: Patient presents for biopsy of target lesion(s) above. Informed consent was obtained. '
+             'Procedural pause was performed. Using standard sterile technique, 1% lidocaine locally, and image guidance, a '
+             '9-gauge vacuum assisted biopsy needle was directed into the region in question. A marker clip was deployed. '
+             'IMPRESSION: Biopsy of the breast as described above. ')
+EXAMS = np.array(['STEREOTACTIC VACUUM ASSISTED LEFT BREAST BIOPSY', 'ULTRASOUND GUIDED CORE BIOPSY RIGHT BREAST',
+                  'MRI GUIDED BIOPSY LT BREAST', 'BILATERAL BREAST BIOPSY', 'US BIOPSY RT BREAST'], dtype=object)
+GE_COLUMNS = ['Patient ID', 'Index Exam Study UID',
+              'Race (American Indian or Alaska Native, Asian, Black or African American, White)',
+              'Ethnicity (Hispanic or Latino or Not Hispanic or Latino)', 'Age', 'Gender',
+              'Type of Breast Cancer (DCIS, IDC, IC, Other)', 'Invasive (Yes or No)', 'Type of Soft Tissue Lesion',
+              'Mass Shape (Oval, Round, or Irregular)', 'Mass Margin', 'Mass Density', 'Date of Study', 'Year of Study',
+              'Radiology Report BIRADS Code (0-6)', 'Breast Composition', 'Acquisition Device Manufacturer',
+              'Acquisition Device Model', 'Type of Image Data (Negative, Benign, or Malignant)', 'Presence of Calcification',
+              'Biopsy Finding (Negative, Benign, Malignant)', 'Biopsy Interval (Days)']
+
+
+def _uids(rng, size, prefix='2.25.'):
+    high = rng.integers(10 ** 17, 10 ** 18, size=size).astype(str).astype(object)
+    low = rng.integers(10 ** 17, 10 ** 18, size=size).astype(str).astype(object)
+    return prefix + high + low
+
+def _hex_ids(rng, size):
+    values = rng.integers(0, 2 ** 63, size=(size, 2), dtype=np.uint64)
+    return np.array(['%016x%016x' % tuple(value) for value in values], dtype=object)
+
+def _dates(rng, size, start='2016-01-01', days=6 * 365):
+    return pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, size=size), unit='D')
+
+def make_studies(rng, patients):
+    """
+    Return one row per study of the given patients.
+    """
+    counts = rng.integers(1, 5, size=len(patients))
+    studies = patients.loc[patients.index.repeat(counts)].reset_index(drop=True)
+    studies['Study_Instance_UID'] = _uids(rng, len(studies))
+    studies['study_date'] = _dates(rng, len(studies))
+    return studies
+
+def make_meta(rng, studies):
+    """
+    Return the dicom meta rows of the given studies (2D, 3D and synthesized 2D scans with 4-8 views each).
+    """
+    scans = []
+    for scan_type, share in [('2D', 1.0), ('3D', 0.6), ('S2D', 0.4)]:
+        scan = studies.loc[rng.random(len(studies)) < share].copy()
+        scan['scan'] = scan_type
+        scans.append(scan)
+    scans = pd.concat(scans, ignore_index=True)
+
+    standard = scans.loc[scans.index.repeat(4)].reset_index(drop=True)
+    standard['view'] = np.tile(VIEWS, len(scans))
+    extra = scans.loc[scans.index.repeat(rng.integers(0, 5, size=len(scans)))].reset_index(drop=True)
+    extra['view'] = rng.choice(EXTRA_VIEWS, size=len(extra))
+    meta = pd.concat([standard, extra], ignore_index=True)
+    size = len(meta)
+
+    is_ge = meta['model'] == 1
+    special = rng.random(size)
+    description = np.where(meta['scan'] == '3D', 'Tomosynthesis Reconstruction ' + meta['view'],
+                           np.where(meta['scan'] == 'S2D', 'C-View ' + meta['view'], meta['view']))
+    description = np.where(is_ge & (meta['scan'] == 'S2D') & (special < 0.5), 'V-Preview', description)
+    description = np.where(is_ge & (meta['scan'] == '2D') & (special < 0.3), '2D_PROC', description)
+    frames = np.where(meta['scan'] == '3D', rng.integers(40, 90, size=size).astype(float), np.where(special < 0.5, 1.0, np.nan))
+    outlier = rng.random(size)
+
+    return pd.DataFrame({
+        'Patient_ID': meta['patientId'],
+        'Study_Instance_UID': meta['Study_Instance_UID'],
+        'Manufacturer': MODELS[meta['model'], 0],
+        'Manufacturer_Model_Name': MODELS[meta['model'], 1],
+        'Study_Date': meta['study_date'].dt.strftime('%Y%m%d').astype(int),
+        'Study_Description': np.where(outlier < 0.01, 'STEREOTACTIC BIOPSY', np.where(outlier < 0.02, 'SPECIMEN', 'MAMMO SCREENING BILATERAL')),
+        'Patient_Sex': np.where(outlier > 0.995, 'M', 'F'),
+        'Patient_Birth_Date': meta['birth_date'],
+        'SOP Instance UID': _uids(rng, size),
+        'Frame of Reference UID': _uids(rng, size, '1.2.840.113681.'),
+        'Series_Description': description,
+        'Number of Frames': frames,
+        'Image Laterality': np.where(description == 'V-Preview', '', meta['view'].str[0]),
+        'View Position': rng.choice(['CC', 'MLO'], size=size),
+        'Rows': rng.choice([2294, 3328, 4096], size=size),
+        'Columns': rng.choice([1914, 2560, 3328], size=size),
+        'Window Center': np.where(special > 0.97, np.nan, 2047.0),
+        'Window Width': 4095.0,
+        'Presentation Intent Type': np.where((outlier > 0.02) & (outlier < 0.04), 'FOR PROCESSING', 'FOR PRESENTATION'),
+        'Estimated Radiographic Magnification Factor': np.where((outlier > 0.04) & (outlier < 0.05), 1.8, 1.07),
+        'Breast Implant Present': np.where((outlier > 0.05) & (outlier < 0.055), 'YES', 'NO'),
+        'View Modifier Code Sequence Meaning': np.where((outlier > 0.055) & (outlier < 0.065), 'spot compression', ''),
+        'Plane Orientation': np.where(description == 'V-Preview', rng.choice(ORIENTATIONS, size=size), ''),
+        'Path': ('/mnt/disk' + rng.integers(1, 7, size=size).astype(str).astype(object) + '/Group ' + meta['group']
+                 + '/' + meta['patientId'] + '/' + meta['Study_Instance_UID'] + '/' + _uids(rng, size, '') + '.dcm'),
+    })
+
+def make_reports(rng, studies):
+    """
+    Return the radiology reports of the given studies. Some studies have an addendum.
+    """
+    reports = pd.concat([studies, studies.loc[rng.random(len(studies)) < 0.2]], ignore_index=True)
+    size = len(reports)
+    text = ('EXAM: BILATERAL 2D SCREENING DIGITAL MAMMOGRAPHY WITH 3D BREAST TOMOSYNTHESIS  ACCESSION: [ID]    HISTORY:  Screening.    '
+            + FILLER + 'Breast Density: ' + rng.choice(DENSITIES, size=size) + '    IMPRESSION:    '
+            + rng.choice(BIRADS, size=size) + '    ' + FILLER)
+    text = np.where(rng.random(size) < 0.05, 'ULTRASOUND BILATERAL ' + rng.choice(BIRADS, size=size), text)
+    return pd.DataFrame({'Study_Instance_UID': reports['Study_Instance_UID'], 'reports': text})
+
+def make_biopsy_reports(rng, biopsies):
+    """
+    Return the biopsy report text of the given biopsies (procedure, then pathology addendum).
+    """
+    size = len(biopsies)
+    outcome = np.where(biopsies['group'] == 'A', 'Malignant', rng.choice(['Benign', 'High Risk'], size=size))
+    return ('EXAM: ' + rng.choice(EXAMS, size=size) + ' ACCESSION: [ID] HISTORY: Calcifications at approximately o\'clock. '
+            + PROCEDURE + ',EXAM: Pathology Addendum ACCESSION: [ID] PATHOLOGY OUTCOME SECTION: ' + outcome
+            + ' PATHOLOGY RESULT SECTION: Pathology yields findings concordant with imaging. RECOMMENDATION: 1: Surgical consult,')
+
+def make_biopsies(rng, studies):
+    """
+    Return the five biopsy files of the group A and B patients of the given studies.
+
+    Returns:
+        dict: file name -> DataFrame
+    """
+    index_studies = studies.loc[studies['group'].isin(['A', 'B'])].drop_duplicates(subset=['patientId'])
+    index_studies = index_studies.reset_index(drop=True)
+    size = len(index_studies)
+    bx_date = index_studies['study_date'] + pd.to_timedelta(rng.integers(-30, 90, size=size), unit='D')
+    source = np.where(index_studies['model'] == 1, rng.choice(['a', 'a2', 'ge'], size=size, p=[0.4, 0.2, 0.4]),
+                      rng.choice(['a', 'a2'], size=size, p=[0.7, 0.3]))
+    report = make_biopsy_reports(rng, index_studies)
+
+    a = pd.DataFrame({'patientId': index_studies['patientId'],
+                      'completedDate': bx_date.dt.strftime('%Y.%m.%d %H:%M:%S'),
+                      'studyUID': index_studies['Study_Instance_UID'] + '-1',
+                      'reports': 'studyInstanceUID: ' + index_studies['Study_Instance_UID'] + '\n\n' + report})
+    a2 = pd.DataFrame({'Column1': np.arange(size), 'Disk_ID': rng.integers(1, 7, size=size), 'Serial_Number': 2.02e11,
+                       'Group': index_studies['group'], 'Accession_Number': _hex_ids(rng, size).astype(str),
+                       'Patient_ID': index_studies['patientId'],
+                       'Representative_Study_Instance_UID': index_studies['Study_Instance_UID'],
+                       'Manufacturer_info': 'HOLOGIC, Inc./Selenia Dimensions', 'DBT_View': 4, 'has_dbt_report': True,
+                       'DBT_report': 'EXAM: BILATERAL 2D SCREENING DIGITAL MAMMOGRAPHY ' + FILLER,
+                       'DBT_StudyDate': index_studies['study_date'].dt.strftime('%-m/%-d/%y'), 'has_bx_report': True,
+                       'Select': 'Accept', 'reasons of rejection': '', 'bx_report': report})
+    finding = np.where(index_studies['group'] == 'A', 'Malignant', 'Benign')
+    ge = pd.DataFrame({column: '' for column in GE_COLUMNS}, index=index_studies.index)
+    ge['Patient ID'] = index_studies['patientId']
+    ge['Index Exam Study UID'] = index_studies['Study_Instance_UID']
+    ge['Age'] = rng.integers(40, 80, size=size)
+    ge['Gender'] = 'F'
+    ge['Date of Study'] = 'excluded'
+    ge['Year of Study'] = index_studies['study_date'].dt.year
+    ge['Acquisition Device Manufacturer'] = 'GE Medical Systems'
+    ge['Acquisition Device Model'] = 'Senographe Pristina'
+    ge['Type of Image Data (Negative, Benign, or Malignant)'] = finding
+    ge['Biopsy Finding (Negative, Benign, Malignant)'] = finding
+    ge['Biopsy Interval (Days)'] = rng.integers(0, 60, size=size)
+
+    second = rng.random(size) < 0.3  # the b files repeat some patients with a later biopsy
+    return {'medicom_bx_a.csv': a.loc[source == 'a'],
+            'medicom_bx_b.csv': a.loc[(source == 'a') & second],
+            'medicom_bx_a2.csv': a2.loc[source == 'a2'],
+            'medicom_bx_b2.csv': a2.loc[(source == 'a2') & second],
+            'medicom_bx_ge.csv': ge.loc[source == 'ge']}
+
+def make_patients(rng, size):
+    return pd.DataFrame({'patientId': _hex_ids(rng, size),
+                         'group': rng.choice(GROUPS, size=size),
+                         'model': rng.choice([0, 1], size=size, p=[0.7, 0.3]),
+                         'birth_date': _dates(rng, size, '1940-01-01', 40 * 365).strftime('%Y%m%d').astype(int)})
+
+def generate(directory, scale=1, seed=0):
+    """
+    Write a synthetic raw_file directory.
+
+    Args:
+        directory (str): base directory (the raw files are written to <directory>/raw_file)
+        scale (float): 1 is 1,000 patients
+        seed (int): random seed
+
+    Returns:
+        dict: file name -> number of rows
+    """
+    rng = np.random.default_rng(seed)
+    raw_dir = os.path.join(directory, 'raw_file')
+    os.makedirs(raw_dir, exist_ok=True)
+    total = max(int(PATIENTS_PER_SCALE * scale), 1)
+    counts = {}
+    for start in range(0, total, BLOCK):
+        studies = make_studies(rng, make_patients(rng, min(BLOCK, total - start)))
+        frames = {'medicom_dm_1_6.csv': make_meta(rng, studies), 'medicom_reports.csv': make_reports(rng, studies)}
+        frames.update(make_biopsies(rng, studies))
+        for name, frame in frames.items():
+            frame.to_csv(os.path.join(raw_dir, name), index=False, encoding='utf-8-sig' if start == 0 else 'utf-8',
+                         mode='w' if start == 0 else 'a', header=start == 0)
+            counts[name] = counts.get(name, 0) + len(frame)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic raw_file directory for benchmarks.')
+    parser.add_argument('directory')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for name, count in generate(args.directory, args.scale, args.seed).items():
+        print(name, count)
@@ -0,0 +1,141 @@
+"""
+The module classifies the exam type and the index interval of the merged studies column by column.
+It returns the same values as the row-wise rules it replaced (`get_index_type`, `get_index_interval_day` and
+`get_index_interval_category`, kept as the reference of test_merge_dates.py), but the dates are compared as int64
+nanoseconds and the intervals are binned in one searchsorted call.
+Biopsy dates carry a time of day, so they are not truncated to days before they are compared;
+intervals are floored to days like `Timedelta.days`.
+
+1. Choose the governing biopsy date of each study (left, right or the later of the two)
+2. Classify the exam type from the index date, or from the governing biopsy date if there is no index date
+3. Get the interval to the index date, or to the governing biopsy date
+4. Bin the absolute interval into the interval categories
+"""
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86400 * 10 ** 9
+# (group, labels tried in order) whose biopsy date governs the studies without an index date
+BIOPSY_LABELS = {'A': ['malignant'],
+                 'B': ['benign', 'high risk']}
+CATEGORY_EDGES = [0, 365, 730, 1095, 1460, 1825]  # upper bounds (inclusive) of categories 0-5
+CATEGORIES = np.array([0, 1, 2, 3, 4, 5, '5_over'], dtype=object)
+
+NONE, LEFT, RIGHT = 0, 1, 2
+
+
+def nanoseconds(column):
+    """
+    Return a date column as int64 nanoseconds and a mask of the valid dates.
+
+    Args:
+        column (Series): datetime64 (or parsable) dates
+
+    Returns:
+        tuple: int64 ndarray, bool ndarray (False for NaT)
+    """
+    if not pd.api.types.is_datetime64_any_dtype(column):
+        column = pd.to_datetime(column, errors='coerce')
+    values = column.to_numpy(dtype='datetime64[ns]')
+    return values.view('int64'), ~np.isnat(values)
+
+def get_governing_biopsies(dicom, fall_through=True):
+    """
+    Return which biopsy date governs each study: LEFT, RIGHT or NONE.
+    If both breasts have the label, the later biopsy governs. If either of their dates is missing,
+    the exam type tries the next label (fall_through) while the interval takes the right biopsy, as the row-wise rules do.
+
+    Args:
+        dicom (DataFrame): merged dicom meta with group, labels and biopsy dates
+        fall_through (bool): try the next label if both breasts have the label and a date is missing
+
+    Returns:
+        ndarray: int8 LEFT, RIGHT or NONE per row
+    """
+    group = dicom['group'].astype(str).to_numpy()
+    left_label = dicom['left_label'].astype(str)
+    right_label = dicom['right_label'].astype(str)
+    lt, lt_valid = nanoseconds(dicom['lt_bx_date'])
+    rt, rt_valid = nanoseconds(dicom['rt_bx_date'])
+    both_valid = lt_valid & rt_valid
+
+    choice = np.full(len(dicom), NONE, dtype=np.int8)
+    for group_name, labels in BIOPSY_LABELS.items():
+        pending = group == group_name
+        for label in labels:
+            left = left_label.str.contains(label, regex=False).to_numpy()
+            right = right_label.str.contains(label, regex=False).to_numpy()
+            both = pending & left & right
+            choice[both & both_valid & (lt >= rt)] = LEFT
+            choice[both & both_valid & (lt < rt)] = RIGHT
+            if not fall_through:
+                choice[both & ~both_valid] = RIGHT
+            choice[pending & left & ~right] = LEFT
+            choice[pending & right & ~left] = RIGHT
+            # Only the studies with neither label (or both labels and a missing date) try the next label.
+            missing = both & ~both_valid if fall_through else False
+            pending = (pending & ~left & ~right) | missing
+    return choice
+
+def _biopsy_dates(dicom, choice):
+    lt, lt_valid = nanoseconds(dicom['lt_bx_date'])
+    rt, rt_valid = nanoseconds(dicom['rt_bx_date'])
+    return np.where(choice == LEFT, lt, rt), np.where(choice == LEFT, lt_valid, rt_valid)
+
+def get_index_types(dicom, choice):
+    """
+    Return the exam type of each study (1-index, 2-pre_index, 3-post_index, 4-pre_bx, 5-post_bx or '').
+
+    Args:
+        dicom (DataFrame): merged dicom meta with Study_Date and index_date
+        choice (ndarray): governing biopsy of each study (get_governing_biopsies)
+
+    Returns:
+        ndarray: exam type per row
+    """
+    study, study_valid = nanoseconds(dicom['Study_Date'])
+    index, index_valid = nanoseconds(dicom['index_date'])
+    biopsy, biopsy_valid = _biopsy_dates(dicom, choice)
+    indexed = study_valid & index_valid
+    after_study = biopsy_valid & study_valid & (biopsy > study)
+    return np.select([indexed & (study == index),
+                      indexed & (study < index),
+                      indexed & (study > index),
+                      (choice != NONE) & after_study,
+                      choice != NONE],
+                     ['1-index', '2-pre_index', '3-post_index', '4-pre_bx', '5-post_bx'],
+                     default='').astype(object)
+
+def get_index_interval_days(dicom, choice):
+    """
+    Return the days from the index study (or the governing biopsy, if there is no index date) to each study.
+
+    Args:
+        dicom (DataFrame): merged dicom meta with Study_Date and index_date
+        choice (ndarray): governing biopsy of each study (get_governing_biopsies with fall_through=False)
+
+    Returns:
+        ndarray: float days, NaN if there is no date to compare with
+    """
+    study, study_valid = nanoseconds(dicom['Study_Date'])
+    index, index_valid = nanoseconds(dicom['index_date'])
+    biopsy, biopsy_valid = _biopsy_dates(dicom, choice)
+    days = np.full(len(dicom), np.nan)
+    from_biopsy = (choice != NONE) & study_valid & biopsy_valid
+    days[from_biopsy] = (study[from_biopsy] - biopsy[from_biopsy]) // NS_PER_DAY
+    from_index = study_valid & index_valid
+    days[from_index] = (study[from_index] - index[from_index]) // NS_PER_DAY
+    return days
+
+def get_index_interval_categories(days):
+    """
+    Return the interval category of each absolute interval (0, 1-5 per year, or 5_over).
+
+    Args:
+        days (ndarray): interval days
+
+    Returns:
+        Series: category per row (int, or object with 5_over)
+    """
+    bins = np.searchsorted(CATEGORY_EDGES, np.abs(days), side='left')
+    return pd.Series(CATEGORIES[bins]).infer_objects()
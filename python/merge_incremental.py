@@ -0,0 +1,82 @@
+"""
+The module lets dicom_merge.py merge again only the patients touched by new or changed rows.
+Every step of the merge depends only on the rows of one patient, so the patients found in the delta files
+are merged again from the full parsed inputs and spliced into the previous merged output.
+The delta files only tell which patients changed: their rows are not read. The full parsed inputs (the outputs of
+medicom_dicom.py, medicom_bx.py and medicom_report.py run on the updated exports) must already contain the changes.
+
+1. Find the patients of the new or changed dicom, biopsy and report rows
+2. Keep only the rows of those patients in the merge inputs
+3. Replace the rows of those patients in the previous merged output
+"""
+import io
+import os
+import pandas as pd
+import merge_rules
+
+
+def _read_keys(path, column):
+    if not path or not os.path.exists(path):
+        return set()
+    return set(pd.read_csv(path, encoding='utf-8-sig', usecols=[column], dtype=str, keep_default_na=False)[column])
+
+def affected_patients(dicom, delta_files):
+    """
+    Return the patients with new or changed rows.
+
+    Args:
+        dicom (DataFrame): parsed dicom meta (all patients)
+        delta_files (dict): 'dicom', 'biopsy' and 'report' -> list of delta CSV paths in the format of the parsed files.
+            Missing files are ignored.
+
+    Returns:
+        set: patient ids
+    """
+    patients = set()
+    for path in delta_files.get('dicom', []):
+        patients |= _read_keys(path, 'Patient_ID')
+    for path in delta_files.get('biopsy', []):
+        patients |= _read_keys(path, 'patientId')
+    studies = set()
+    for path in delta_files.get('report', []):
+        studies |= _read_keys(path, 'Study_Instance_UID')
+    if studies:
+        patients |= set(dicom.loc[dicom['Study_Instance_UID'].astype(str).isin(studies), 'Patient_ID'].astype(str))
+    return patients
+
+def restrict(patients, dicom, biopsy_lt, biopsy_rt, mg_report):
+    """
+    Keep only the rows of the given patients in the merge inputs.
+
+    Returns:
+        tuple: dicom, biopsy_lt, biopsy_rt, mg_report
+    """
+    dicom = dicom.loc[dicom['Patient_ID'].astype(str).isin(patients)]
+    biopsy_lt = biopsy_lt.loc[biopsy_lt['patientId'].astype(str).isin(patients)]
+    biopsy_rt = biopsy_rt.loc[biopsy_rt['patientId'].astype(str).isin(patients)]
+    mg_report = mg_report.loc[mg_report['Study_Instance_UID'].isin(dicom['Study_Instance_UID'])]
+    return dicom, biopsy_lt, biopsy_rt, mg_report
+
+def splice(merged_path, merged, patients):
+    """
+    Replace the rows of the given patients in the previous merged output.
+    The rows are spliced as text, so the previous rows are written back unchanged.
+    The rows are ordered like a full merge: by group, then the step 6 key of patient id and scan type (merge_rules.pid_scan_type).
+
+    Args:
+        merged_path (str): previous merged CSV
+        merged (DataFrame): merged rows of the given patients
+        patients (set): patient ids that were merged again
+
+    Returns:
+        DataFrame: the full merged output
+    """
+    previous = pd.read_csv(merged_path, encoding='utf-8-sig', index_col=0, dtype=str, keep_default_na=False)
+    previous = previous.loc[~previous['Patient_ID'].isin(patients)]
+    # Format the new rows as text the same way to_csv formats a full merge (e.g. dates without 00:00:00).
+    merged = pd.read_csv(io.StringIO(merged.to_csv()), index_col=0, dtype=str, keep_default_na=False)
+    spliced = pd.concat([previous, merged[previous.columns]], ignore_index=True)
+    # The rows of one patient stay in their order; the patients are ordered exactly like a full merge orders them.
+    order = spliced.assign(key=merge_rules.pid_scan_type(spliced['Patient_ID'], spliced['Scan_Type']))
+    order = order.sort_values(by=['Group', 'key'], kind='stable').index
+    return spliced.loc[order].reset_index(drop=True)
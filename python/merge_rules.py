@@ -0,0 +1,346 @@
+"""
+The module holds the study rules of dicom_merge.py (steps 5-7).
+Every rule depends only on the studies of one patient, so the merged table can be split by patientId
+and the partitions can be processed in parallel on a process pool.
+
+5. Creates new columns and leaves only studies that meet the requirements.
+6. Select an index study.(index_select is true, view_count is high, and study date is most recent study)
+7. classify Non-index studies as pre-index or post-index based on the index date.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import merge_dates
+import rule_profile
+import step_log
+
+
+def change_group_c(dicom):
+    """
+    Change group D with birads of 2 or 3 to group C.
+
+    Args:
+        dicom_metas (list): dicom_metas
+
+    Returns:
+        str: a single letter group name
+    """  
+    group = dicom['group']
+    birads = dicom['birads']
+
+    if group == 'C':
+        if birads == '2' or birads == '3':
+            return 'D'
+        else:
+            return 'C'
+    else:
+        return group
+
+def get_study_label(dicom):
+    """
+    Return the study label(e.g. malignant)
+
+    Args:
+        dicom_meta (dict): dicom meta
+
+    Returns:
+        str: study label
+    """
+    left_label = dicom['left_label']
+    right_label = dicom['right_label']
+
+    if 'malignant' in left_label or 'malignant' in right_label:
+        return 'malignant'
+    elif 'high risk' in left_label or 'high risk' in right_label:
+        return 'high risk'
+    elif 'benign' in left_label or 'benign' in right_label:
+        return 'benign'
+    else:
+        return 'NA'
+
+def devide_accept_reject(dicom):
+    """
+    Return Whether the conditions by group match
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: If true, accept, otherwise reject.
+    """
+    group = dicom['group']
+    study_label = dicom['study_label']
+    mammo = dicom['mammo']  # 'mammo' in the report text (medicom_report.py)
+
+    if mammo == True :
+        if group == 'A' and study_label == 'malignant':
+            return 'accept'
+        elif group == 'B' and study_label == 'benign' :
+            return 'accept'
+        elif group == 'B' and study_label == 'high risk' :
+            return 'accept'
+        elif group == 'C' and study_label == 'NA' :
+            return 'accept'
+        elif group == 'D' and study_label != 'malignant' :
+            return 'accept'
+        else:
+            return 'reject'
+    else:
+        return 'reject'
+
+def get_bx_label_lt(dicom):
+    """
+    Returns left biopsy results that meet the time interval condition. only group a and b.
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: left biopsy result
+    """
+    group = str(dicom['group'])
+    left_label = str(dicom['left_label'])
+    interval_lt = dicom['interval_lt']
+
+    if group == 'A' and 'malignant' in left_label :
+        if interval_lt < 0 or interval_lt > 365 :
+            return ''
+        else:
+            return 'malignant'
+
+    elif group == 'B' and 'high risk' in left_label :
+        if interval_lt < 0 or interval_lt > 365 :
+            return ''
+        else:
+            return 'high risk'
+
+    elif group == 'B' and 'benign' in left_label :
+        if interval_lt < 0 or interval_lt > 365 :
+            return ''
+        else:
+            return 'benign'
+
+def get_bx_label_rt(dicom):
+    """
+    Returns right biopsy results that meet the time interval condition. only group a and b.
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: right biopsy result
+    """
+    group = str(dicom['group'])
+    right_label = str(dicom['right_label'])
+    interval_rt = dicom['interval_rt']
+
+    if group == 'A' and 'malignant' in right_label :
+        if interval_rt < 0 or interval_rt > 365 :
+            return ''
+        else:
+            return 'malignant'
+
+    elif group == 'B' and 'high risk' in right_label :
+        if interval_rt < 0 or interval_rt > 365 :
+            return ''
+        else:
+            return 'high risk'
+
+    elif group == 'B' and 'benign' in right_label :
+        if interval_rt < 0 or interval_rt > 365 :
+            return ''
+        else:
+            return 'benign'
+
+def get_bx_study(dicom):
+    """
+    Returns study result that meet the time interval condition. only group a and b.
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: study result
+    """
+    left_bx = dicom['left_bx']
+    right_bx = dicom['right_bx']
+
+    if left_bx == 'malignant' or right_bx == 'malignant':
+        return 'malignant'
+    elif left_bx == 'high risk' or right_bx == 'high risk':
+        return 'high risk'
+    elif left_bx == 'benign' or right_bx == 'benign':
+        return 'benign'
+    else:
+        return ''
+
+def get_index_study(dicom):
+    """
+    Returns whether the study meets the requirements for each group.
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: If true, 'available', otherwise 'unavailable'.
+    """
+    select = dicom['select']
+    group = dicom['group']
+    study_bx = dicom['study_bx']
+    study_label = dicom['study_label']
+    
+    if select == 'accept':
+        if group == 'A' and study_bx == 'malignant':
+            return 'available'
+        elif group == 'B' and study_bx == 'high risk':
+            return 'available'
+        elif group == 'B' and study_bx == 'benign':
+            return 'available'
+        elif group == 'C' and study_label == 'NA':
+            return 'available'
+        elif group == 'D' and study_label != 'malignant':
+            return 'available'
+        else:
+            return 'unavailable'
+
+def change_lt_label(dicom):
+    """
+    Returns the left breast label (e.g. malignant, high risk, benign)
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: the left breast label
+    """
+    biopsy_side_lt = dicom['biopsy_side_lt']
+    left_label = dicom['left_label']
+
+    if 'unknown' in biopsy_side_lt:
+        return ''
+    elif 'malignant' in left_label:
+        return 'malignant'
+    elif 'high risk' in left_label:
+        return 'high risk'
+    elif 'benign' in left_label:
+        return 'benign'
+    else:
+        return ''
+
+def change_rt_label(dicom):
+    """
+    Returns the right breast label (e.g. malignant, high risk, benign)
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: the right breast label
+    """
+    biopsy_side_rt = dicom['biopsy_side_rt']
+    right_label = dicom['right_label']
+
+    if 'unknown' in biopsy_side_rt:
+        return ''
+    elif 'malignant' in right_label:
+        return 'malignant'
+    elif 'high risk' in right_label:
+        return 'high risk'
+    elif 'benign' in right_label:
+        return 'benign'
+    else:
+        return ''
+
+
+def pid_scan_type(patient_id, scan_type):
+    """
+    Return the key of step 6: the patient id and the scan type joined by '_' (e.g. 1234_3D).
+    The studies of one key are ranked against each other, and the merged output is ordered by group, then this key.
+    Note that this is not the order of (patient id, scan type): '1234_3D' sorts before '123_3D'.
+
+    Args:
+        patient_id (Series): patient ids
+        scan_type (Series): scan types
+
+    Returns:
+        Series: key per row
+    """
+    return patient_id + "_" + scan_type
+
+def classify_studies(dicom):
+    """
+    Run steps 5-7 on the merged DICOM meta table.
+
+    Args:
+        dicom (DataFrame): merged dicom meta from steps 1-4
+
+    Returns:
+        DataFrame: accepted studies with the index type, interval and labels
+    """
+    dicom = dicom.copy()
+    #5. Creates new columns and leaves only studies that meet the requirements.
+    step_log.mark('dicom_merge', '5. Select studies', dicom)
+    dicom['group'] = rule_profile.apply(dicom, change_group_c)
+    dicom['study_label'] = rule_profile.apply(dicom, get_study_label)
+    dicom['select'] = rule_profile.apply(dicom, devide_accept_reject)
+    dicom['left_bx'] = rule_profile.apply(dicom, get_bx_label_lt)
+    dicom['right_bx'] = rule_profile.apply(dicom, get_bx_label_rt)
+    dicom['study_bx'] = rule_profile.apply(dicom, get_bx_study)
+    dicom['index_select'] = rule_profile.apply(dicom, get_index_study)
+    dicom = dicom.loc[dicom['select']=='accept']
+
+    #6. Select an index study.(index_select is true, view_count is high, and study date is most recent study) 
+    step_log.mark('dicom_merge', '6. Select index study', dicom)
+    dicom['pid+scan_type'] = pid_scan_type(dicom['patientId'], dicom['scan_type'])
+    dicom = dicom.sort_values(by=['group', 'pid+scan_type', 'index_select', 'view_count', 'Study_Date'], ascending=[True, True, True, False, False])
+    dicom_index = dicom.loc[dicom['index_select']=='available'].drop_duplicates(subset=['pid+scan_type'], keep = 'first')
+    dicom_index = dicom_index[['pid+scan_type', 'Study_Date']]
+    dicom_index.rename(columns={'Study_Date':'index_date'}, inplace=True)
+
+    #7. classify Non-index studies as pre-index or post-index based on the index date.
+    step_log.mark('dicom_merge', '7. Classify index type', dicom)
+    #   (column by column with merge_dates; the row-wise rules it replaced are the reference of test_merge_dates.py)
+    dicom = pd.merge(dicom, dicom_index, on='pid+scan_type', how='left')
+    dicom['index_date'] = pd.to_datetime(dicom['index_date'], format='%Y-%m-%d', errors='ignore')
+    dicom['index'] = rule_profile.call(merge_dates.get_index_types, dicom, merge_dates.get_governing_biopsies(dicom))
+    index_interval_day = rule_profile.call(merge_dates.get_index_interval_days, dicom,
+                                           merge_dates.get_governing_biopsies(dicom, fall_through=False))
+    dicom = dicom.fillna('')
+    dicom['index_interval_day'] = index_interval_day
+    dicom['index_interval_category'] = rule_profile.call(merge_dates.get_index_interval_categories, index_interval_day).to_numpy()
+    dicom['left_label'] = rule_profile.apply(dicom, change_lt_label)
+    dicom['right_label'] = rule_profile.apply(dicom, change_rt_label)
+    return dicom
+
+def partition_by_patient(dicom, partitions):
+    """
+    Split the table into hash partitions of patientId. All studies of a patient are in the same partition.
+
+    Args:
+        dicom (DataFrame): merged dicom meta
+        partitions (int): number of partitions
+
+    Returns:
+        list: non-empty DataFrames, rows in their original order
+    """
+    keys = pd.util.hash_pandas_object(dicom['patientId'].astype(str), index=False).to_numpy() % partitions
+    return [dicom.loc[keys == key] for key in range(partitions) if (keys == key).any()]
+
+def classify_studies_parallel(dicom, workers):
+    """
+    Run steps 5-7 on patientId partitions in a process pool.
+    The result has the same rows in the same order as `classify_studies`: step 6 orders the rows by group and pid+scan_type
+    first, and all rows sharing those keys come from one partition, in which their order is already final.
+
+    Args:
+        dicom (DataFrame): merged dicom meta from steps 1-4
+        workers (int): number of processes
+
+    Returns:
+        DataFrame: accepted studies with the index type, interval and labels
+    """
+    # The platform's default start method: under spawn the workers import this module (and the main script) again,
+    # so the scripts keep their work under `if __name__ == '__main__'`.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(classify_studies, partition_by_patient(dicom, workers)))
+    dicom = pd.concat(results)
+    return dicom.sort_values(by=['group', 'pid+scan_type'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,209 @@
+"""
+The module writes the merged output of dicom_merge.py as compressed partitions, one per Group, Scan_Type and Exam_type,
+and a manifest, so a consumer that needs e.g. the Group A 3D index studies reads one small file instead of the whole CSV.
+The partitions are written in parallel. Each one is a compressed CSV of its rows, indexed like the rows of medicom_merged.csv,
+so the partitions concatenated and sorted by index are the merged output.
+The manifest lists each partition with its keys, row count and column statistics (missing values, min and max,
+and the values of low-cardinality columns), so partitions that cannot match a filter are skipped without being opened.
+The partitions and the manifest are written next to the output directory. The previous output is then renamed aside,
+the new one renamed into place and the previous one deleted last, so readers never see a partial output.
+
+1. Split the merged rows by partition keys
+2. Write the partitions in parallel, each with its column statistics
+3. Write the manifest and replace the previous output
+4. Read only the partitions that can match a filter
+
+Usage:
+    python merged_parts.py <output directory> Group=A Scan_Type=3D Exam_type=1-index [--count]
+"""
+import argparse
+import json
+import os
+import shutil
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+KEYS = ['Group', 'Scan_Type', 'Exam_type']
+MANIFEST = 'manifest.json'
+MAX_VALUES = 16  # distinct values listed in the statistics of a text column
+EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz', 'zstd': '.zst', None: ''}
+
+
+def _directory(keys):
+    # Hive-style directories (Group=A/Scan_Type=3D/...); a missing key is written as Group=__null__
+    return os.path.join(*['%s=%s' % (key, '__null__' if pd.isna(value) else urllib.parse.quote(str(value), safe=''))
+                          for key, value in zip(KEYS, keys)])
+
+def _scalar(value):
+    return value.item() if hasattr(value, 'item') else value
+
+def column_stats(column):
+    """
+    Return the statistics of a column of a partition.
+
+    Args:
+        column (Series): values of the partition
+
+    Returns:
+        dict: nulls, min and max (numbers, or the text of other values), values (text columns with few distinct values)
+    """
+    present = column.dropna()
+    stats = {'nulls': int(column.isna().sum())}
+    if not len(present):
+        return stats
+    if pd.api.types.is_numeric_dtype(present) and not pd.api.types.is_bool_dtype(present):
+        stats.update({'min': _scalar(present.min()), 'max': _scalar(present.max())})
+        return stats
+    text = present.astype(str)
+    stats.update({'min': text.min(), 'max': text.max()})
+    distinct = text.unique()
+    if len(distinct) <= MAX_VALUES:
+        stats['values'] = sorted(distinct)
+    return stats
+
+def write_part(part, path, compression='gzip'):
+    """
+    Write one partition and return its manifest entry.
+
+    Args:
+        part (DataFrame): rows of the partition, indexed like the merged output
+        path (str): compressed CSV path
+        compression (str): a key of EXTENSIONS
+
+    Returns:
+        dict: rows and column statistics of the partition
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    options = {'method': compression, 'mtime': 0} if compression == 'gzip' else compression  # mtime 0: same data, same bytes
+    part.to_csv(path, compression=options)
+    return {'rows': len(part), 'columns': {column: column_stats(part[column]) for column in part.columns}}
+
+def _write_part(item):
+    return write_part(*item)
+
+def write_partitions(df, directory, compression='gzip', workers=1):
+    """
+    Write the merged output as partitions by KEYS, with a manifest.
+
+    Args:
+        df (DataFrame): merged output of dicom_merge.py
+        directory (str): output directory (replaced)
+        compression (str): a key of EXTENSIONS
+        workers (int): number of processes writing the partitions
+
+    Returns:
+        dict: manifest
+    """
+    #1. Split the merged rows by partition keys
+    staging = directory.rstrip(os.sep) + '.partial'
+    shutil.rmtree(staging, ignore_errors=True)
+    parts = []
+    for keys, part in df.groupby(KEYS, sort=True, dropna=False):
+        relative = os.path.join(_directory(keys), 'part.csv' + EXTENSIONS[compression])
+        parts.append((relative, dict(zip(KEYS, [None if pd.isna(key) else _scalar(key) for key in keys])), part))
+
+    #2. Write the partitions in parallel, each with its column statistics
+    items = [(part, os.path.join(staging, relative), compression) for relative, _, part in parts]
+    if workers > 1 and len(items) > 1:
+        # The platform's default start method: under spawn the workers import this module (and the main script) again,
+        # so the scripts keep their work under `if __name__ == '__main__'`.
+        with ProcessPoolExecutor(max_workers=min(workers, len(items))) as pool:
+            entries = list(pool.map(_write_part, items))
+    else:
+        entries = [_write_part(item) for item in items]
+
+    #3. Write the manifest and replace the previous output
+    manifest = {'keys': KEYS, 'columns': [df.index.name or ''] + list(df.columns), 'rows': len(df), 'compression': compression,
+                'partitions': [dict(path=relative, keys=keys, **entry) for (relative, keys, _), entry in zip(parts, entries)]}
+    os.makedirs(staging, exist_ok=True)
+    with open(os.path.join(staging, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    # The previous output is moved aside, not deleted first, so the directory is missing only between two renames.
+    previous = directory.rstrip(os.sep) + '.old'
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, previous)
+    os.replace(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+def _can_match(partition, column, wanted):
+    stats = partition['columns'].get(column)
+    if stats is None:
+        return True
+    if 'values' in stats:
+        return any(str(value) in stats['values'] for value in wanted)
+    if 'min' not in stats:
+        return False
+    if isinstance(stats['min'], str):
+        return any(stats['min'] <= str(value) <= stats['max'] for value in wanted)
+    numbers = pd.to_numeric(pd.Series(list(wanted), dtype=object), errors='coerce').dropna()
+    return bool(((numbers >= stats['min']) & (numbers <= stats['max'])).any())
+
+def select_partitions(manifest, filters):
+    """
+    Return the partitions that can contain rows matching the filters (by their keys and column statistics).
+
+    Args:
+        manifest (dict): manifest of write_partitions
+        filters (dict): column -> value or list of values
+
+    Returns:
+        list: manifest entries
+    """
+    filters = {column: value if isinstance(value, (list, tuple, set)) else [value] for column, value in filters.items()}
+    return [partition for partition in manifest['partitions']
+            if all(_can_match(partition, column, wanted) for column, wanted in filters.items())]
+
+def read_partitions(directory, filters=None):
+    """
+    Read the rows matching equality filters, opening only the partitions that can contain them.
+
+    Args:
+        directory (str): output directory of write_partitions
+        filters (dict): column -> value or list of values (compared as text, like the merged CSV)
+
+    Returns:
+        DataFrame: matching rows as the text of the merged CSV (like cohort_store, so every partition reads the same types),
+            indexed and ordered like the merged output
+    """
+    #4. Read only the partitions that can match a filter
+    filters = filters or {}
+    manifest = read_manifest(directory)
+    parts = [pd.read_csv(os.path.join(directory, partition['path']), encoding='utf-8-sig', index_col=0, dtype=str,
+                         keep_default_na=False)
+             for partition in select_partitions(manifest, filters)]
+    if not parts:
+        return pd.DataFrame(columns=manifest['columns'][1:])
+    df = pd.concat(parts)
+    df.index = df.index.astype('int64')
+    df = df.sort_index()
+    for column, value in filters.items():
+        wanted = [str(v) for v in (value if isinstance(value, (list, tuple, set)) else [value])]
+        df = df.loc[df[column].isin(wanted)]
+    return df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Select rows of the partitioned merged output.')
+    parser.add_argument('directory', help='output directory of write_partitions')
+    parser.add_argument('filters', nargs='*', help='column=value (repeat a column for IN)')
+    parser.add_argument('--count', action='store_true', help='print the number of rows only')
+    args = parser.parse_args()
+    filters = {}
+    for item in args.filters:
+        column, value = item.split('=', 1)
+        filters.setdefault(column, []).append(value)
+    manifest = read_manifest(args.directory)
+    selected = select_partitions(manifest, filters)
+    print('%d of %d partitions' % (len(selected), len(manifest['partitions'])))
+    df = read_partitions(args.directory, filters)
+    if args.count:
+        print(len(df))
+    else:
+        print(df.to_csv(), end='')
@@ -0,0 +1,129 @@
+"""
+The module caches the values parsed from report texts on disk, keyed by the content of the text.
+The key of a text is a hash of the lowercased text and of the parser version (a hash of the parser source code),
+so a cached value is used only for the same text parsed by the same code; changing a parser invalidates its entries.
+Within a run every distinct text is parsed once, and across runs only the texts not found in the cache are parsed.
+The parsers lowercase the reports before they match anything, so texts differing only in case share one entry.
+The entries of older parser versions are never removed; the cache file can be deleted at any time.
+
+1. Hash the distinct lowercased texts with the parser version
+2. Read the cached values of the known texts
+3. Parse the unseen texts and add them to the cache
+4. Map the values back to every row
+
+Usage:
+    python parse_cache.py <cache path>   # entries per parser
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+
+BATCH = 500  # keys per SELECT (SQLite limits the number of parameters)
+TIMEOUT = 60  # seconds a write waits for another process holding the cache file (e.g. the bx and report stages of pipeline.py)
+
+
+def version(*parts):
+    """
+    Return the version of a parser: a hash of the source code of the modules and functions it runs.
+
+    Args:
+        parts: modules or functions
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(inspect.getsource(part).encode('utf-8'))
+    return digest.hexdigest()
+
+def _key(text, parser_version):
+    return hashlib.sha1((parser_version + '\0' + text).encode('utf-8')).hexdigest()
+
+def _table(name):
+    return '"parsed_%s"' % name.replace('"', '')
+
+def _read(connection, name, keys):
+    found = {}
+    for start in range(0, len(keys), BATCH):
+        batch = keys[start:start + BATCH]
+        query = 'SELECT key, value FROM %s WHERE key IN (%s)' % (_table(name), ', '.join('?' * len(batch)))
+        found.update(connection.execute(query, batch).fetchall())
+    return found
+
+def _as_json(value):
+    return None if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NA else value
+
+def parse_cached(texts, parse, name, parser_version, path=None):
+    """
+    Parse texts through the cache.
+    Same values as `parse(texts)`, but each distinct text is parsed once and cached texts are not parsed again.
+
+    Args:
+        texts (Series): report texts
+        parse (function): parser, Series of texts -> DataFrame of values with the index of the texts
+        name (str): name of the parser in the cache (e.g. 'biopsy')
+        parser_version (str): version of the parser (see `version`)
+        path (str): SQLite cache file (None: the distinct texts are parsed once, without a persistent cache)
+
+    Returns:
+        DataFrame: parsed values with the index of the texts
+    """
+    #1. Hash the distinct lowercased texts with the parser version
+    lowered = texts.astype(object).where(texts.map(lambda text: isinstance(text, str)), None)
+    lowered = lowered.map(lambda text: text.lower() if text is not None else None)
+    codes, distinct = pd.factorize(lowered.to_numpy(), use_na_sentinel=False)
+    first = np.unique(codes, return_index=True)[1]
+    originals = texts.iloc[first].reset_index(drop=True)  # the first text of each distinct lowercased text
+    keys = [_key(text, parser_version) if isinstance(text, str) else None for text in distinct]
+
+    #2. Read the cached values of the known texts
+    connection = sqlite3.connect(path, timeout=TIMEOUT) if path else None
+    try:
+        cached = {}
+        if connection:
+            connection.execute('PRAGMA journal_mode=WAL')  # readers do not block the writer of another parser
+            connection.execute('CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, value TEXT)' % _table(name))
+            cached = _read(connection, name, [key for key in keys if key is not None])
+
+        #3. Parse the unseen texts and add them to the cache
+        unseen = [position for position, key in enumerate(keys) if key not in cached]
+        parsed = parse(originals.iloc[unseen]) if unseen else None
+        columns = list(parsed.columns) if parsed is not None else None
+        values = [None] * len(keys)
+        if parsed is not None:
+            for position, row in zip(unseen, parsed.itertuples(index=False, name=None)):
+                values[position] = [_as_json(value) for value in row]
+        if connection and parsed is not None:
+            new = [(keys[position], json.dumps({'columns': columns, 'values': values[position]}))
+                   for position in unseen if keys[position] is not None]
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO %s VALUES (?, ?)' % _table(name), new)
+    finally:
+        if connection:
+            connection.close()
+
+    #4. Map the values back to every row
+    for position, key in enumerate(keys):
+        if values[position] is None:
+            entry = json.loads(cached[key])
+            columns = columns or entry['columns']
+            values[position] = entry['values']
+    if columns is None:  # no text at all
+        return parse(texts)
+    table = pd.DataFrame(values, columns=columns).fillna(np.nan)
+    return table.iloc[codes].set_axis(texts.index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show the number of cached texts per parser.')
+    parser.add_argument('path', help='SQLite parse cache')
+    args = parser.parse_args()
+    connection = sqlite3.connect(args.path)
+    for (table,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+        print(table, connection.execute('SELECT COUNT(*) FROM "%s"' % table).fetchone()[0])
+    connection.close()
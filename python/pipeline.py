@@ -0,0 +1,226 @@
+"""
+The module runs the four scripts as a pipeline and skips the stages whose outputs are still valid.
+dicom, bx and report are independent and run concurrently in separate processes, then merge runs on their outputs.
+A stage is skipped when the content hash of its inputs and code matches the one recorded at its last successful run
+and all of its outputs still exist. The inputs and outputs are the paths set in the scripts (e.g. META_SHARDS, FEATHER,
+COHORT_STORE), and the stages reading inputs that are not hashed (DICOM_DIR, INCREMENTAL) always run.
+
+1. Fingerprint the inputs and code of each stage
+2. Run the stages whose fingerprint changed, independent stages concurrently
+3. Record the fingerprints of the stages that succeeded
+
+Usage:
+    python pipeline.py            # run the stages that changed
+    python pipeline.py --force    # run every stage
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import medicom_paths
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OUT_DIR = medicom_paths.BASE_DIR
+CACHE = os.path.join(OUT_DIR, '.pipeline_cache.json')
+
+STAGES = {'dicom': {'script': 'medicom_dicom.py', 'after': []},
+          'bx': {'script': 'medicom_bx.py', 'after': []},
+          'report': {'script': 'medicom_report.py', 'after': []},
+          'merge': {'script': 'dicom_merge.py', 'after': ['dicom', 'bx', 'report']}}
+
+
+def stage_files(stage):
+    """
+    Return the files a stage reads and writes, from the constants of its script, so the flags set there are followed.
+    A stage whose inputs cannot be hashed is never skipped: the DICOM tree of medicom_dicom.DICOM_DIR (every file
+    would have to be read), and the incremental merge, which also reads the merged output it replaces.
+
+    Args:
+        stage (str): a key of STAGES
+
+    Returns:
+        dict: 'inputs' and 'outputs' (lists of paths), 'uncached' (why the stage is always run, '' if it can be skipped)
+    """
+    import stage_io
+    if stage == 'dicom':
+        import dicom_shards
+        import medicom_dicom
+        inputs = dicom_shards.shard_paths(medicom_dicom.META_SHARDS) if medicom_dicom.META_SHARDS else [medicom_dicom.META_CSV]
+        outputs = [medicom_dicom.PARSED_CSV] + [stage_io.feather_path(medicom_dicom.PARSED_CSV)] * medicom_dicom.FEATHER
+        uncached = 'DICOM_DIR is set' if medicom_dicom.DICOM_DIR else ''
+    elif stage == 'bx':
+        import medicom_bx
+        inputs = [path for path, _ in medicom_bx.INPUT_FILES]
+        outputs = [medicom_bx.PARSED_LT_CSV, medicom_bx.PARSED_RT_CSV]
+        outputs += [stage_io.feather_path(path) for path in outputs] * medicom_bx.FEATHER
+        uncached = ''
+    elif stage == 'report':
+        import medicom_report
+        import report_store
+        inputs = [medicom_report.INPUT_CSV]
+        outputs = [medicom_report.PARSED_CSV, report_store.text_path(medicom_report.REPORT_STORE),
+                   report_store.index_path(medicom_report.REPORT_STORE)]
+        outputs += [stage_io.feather_path(medicom_report.PARSED_CSV)] * medicom_report.FEATHER
+        uncached = ''
+    else:
+        import dicom_merge
+        parsed = [dicom_merge.DICOM_CSV, dicom_merge.BIOPSY_LT_CSV, dicom_merge.BIOPSY_RT_CSV, dicom_merge.REPORT_CSV]
+        inputs = parsed + [stage_io.feather_path(path) for path in parsed]  # read instead of the CSV when up to date
+        outputs = [dicom_merge.MERGED_CSV]
+        if dicom_merge.COHORT_STORE:
+            outputs.append(dicom_merge.COHORT_DB)
+        if dicom_merge.PARTS_DIR:
+            import merged_parts
+            outputs.append(os.path.join(dicom_merge.PARTS_DIR, merged_parts.MANIFEST))
+        uncached = 'INCREMENTAL is set' if dicom_merge.INCREMENTAL else ''
+    return {'inputs': inputs, 'outputs': outputs, 'uncached': uncached}
+
+def hash_file(path, cache):
+    """
+    Return the sha256 of a file. Files whose size and mtime did not change are not read again.
+
+    Args:
+        path (str): file path
+        cache (dict): path -> [size, mtime_ns, sha256], updated in place
+
+    Returns:
+        str: sha256 hex digest, '' if the file does not exist
+    """
+    if not os.path.exists(path):
+        return ''
+    stat = os.stat(path)
+    cached = cache.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    cache[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return digest.hexdigest()
+
+def code_files(script):
+    """
+    Return the script and every local module it imports, recursively.
+
+    Args:
+        script (str): script file name in this directory
+
+    Returns:
+        list: sorted file paths
+    """
+    found = set()
+    pending = [os.path.join(HERE, script)]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = os.path.join(HERE, name.split('.')[0] + '.py')
+                if os.path.exists(module):
+                    pending.append(module)
+    return sorted(found)
+
+def fingerprint(stage, hashes):
+    """
+    Return the fingerprint of a stage: the hash of its code (flags included) and inputs.
+
+    Args:
+        stage (str): a key of STAGES
+        hashes (dict): file hash cache
+
+    Returns:
+        str: sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    for path in code_files(STAGES[stage]['script']) + stage_files(stage)['inputs']:
+        digest.update(os.path.basename(path).encode() + b'\0' + hash_file(path, hashes).encode() + b'\0')
+    return digest.hexdigest()
+
+def load_cache():
+    if os.path.exists(CACHE):
+        with open(CACHE) as f:
+            return json.load(f)
+    return {'stages': {}, 'files': {}}
+
+def save_cache(cache):
+    with open(CACHE, 'w') as f:
+        json.dump(cache, f, indent=1)
+
+def is_valid(stage, cache, current):
+    """
+    Return whether the recorded outputs of a stage can be reused.
+
+    Args:
+        stage (str): a key of STAGES
+        cache (dict): pipeline cache
+        current (str): fingerprint of the stage now
+    """
+    files = stage_files(stage)
+    return (not files['uncached'] and cache['stages'].get(stage) == current
+            and all(os.path.exists(path) for path in files['outputs']))
+
+def run(force=False):
+    """
+    Run the pipeline. Stages whose dependencies are done run concurrently in separate processes.
+
+    Args:
+        force (bool): run every stage even if its outputs are valid
+
+    Returns:
+        dict: stage -> 'skipped', 'done' or 'failed'
+    """
+    cache = load_cache()
+    status = {}
+    while len(status) < len(STAGES):
+        ready = [stage for stage, spec in STAGES.items()
+                 if stage not in status and all(status.get(dependency) in ('skipped', 'done') for dependency in spec['after'])]
+        blocked = [stage for stage, spec in STAGES.items()
+                   if stage not in status and any(status.get(dependency) == 'failed' for dependency in spec['after'])]
+        for stage in blocked:
+            status[stage] = 'failed'
+        if not ready:
+            break
+
+        processes = {}
+        started = {}  # fingerprint taken before the stage starts: an input edited while it runs is processed next time
+        for stage in ready:
+            started[stage] = fingerprint(stage, cache['files'])
+            uncached = stage_files(stage)['uncached']
+            if not force and is_valid(stage, cache, started[stage]):
+                status[stage] = 'skipped'
+                print(stage, 'skipped (cached)')
+            else:
+                print(stage, 'running' + (' (not cached: %s)' % uncached if uncached else ''))
+                processes[stage] = subprocess.Popen([sys.executable, STAGES[stage]['script']], cwd=HERE)
+        for stage, process in processes.items():
+            if process.wait() == 0:
+                status[stage] = 'done'
+                cache['stages'][stage] = started[stage]
+            else:
+                status[stage] = 'failed'
+                cache['stages'].pop(stage, None)
+            print(stage, status[stage])
+        save_cache(cache)
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the medicom pipeline, skipping stages whose outputs are still valid.')
+    parser.add_argument('--force', action='store_true', help='run every stage')
+    args = parser.parse_args()
+    status = run(force=args.force)
+    sys.exit(1 if 'failed' in status.values() else 0)
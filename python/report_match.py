@@ -0,0 +1,103 @@
+"""
+The module finds the density and birads category of radiology reports in a single pass.
+All patterns of `get_density` and `get_birads` in medicom_report.py are compiled into one regex,
+so each lowercased report is scanned once no matter how many patterns are added.
+If it cannot find the requested feature, it returns an empty string('')
+
+1. Scan every report once and collect every hit with its position
+2. Keep the hit with the highest priority (the first one in the rule order) per report
+"""
+import re
+import numpy as np
+import pandas as pd
+
+# (label, patterns) in priority order. The first matching rule wins, as in the original if-chain.
+BIRADS_RULES = [('6', ['birads: 6', 'category: 6', 'category 6']),
+                ('5', ['birads: 5', 'category: 5', 'category 5']),
+                ('4c', ['birads: 4c', 'category: 4c', 'category 4c']),
+                ('4b', ['birads: 4b', 'category: 4b', 'category 4b']),
+                ('4a', ['birads: 4a', 'category: 4a', 'category 4a']),
+                ('4', ['birads: 4', 'category: 4', 'category 4']),
+                ('3', ['birads: 3', 'category: 3', 'category 3']),
+                ('2', ['birads: 2', 'category: 2', 'category 2']),
+                ('1', ['birads: 1', 'category: 1', 'category 1']),
+                ('0', ['birads: 0', 'category: 0', 'category 0']),
+                ('2', [': - benign']),
+                ('2', [': - probably benign']),
+                ('1', [': - negative'])]
+DENSITY_RULES = [('D', ['extremely dense']),
+                 ('C', ['heterogeneously dense']),
+                 ('B', ['scattered fibroglandular']),
+                 ('A', ['entirely fatty', 'predominantly fatty'])]
+MAMMO = 'mammo'
+
+
+def build_patterns():
+    """
+    Return the pattern table used by the matcher.
+
+    Returns:
+        dict: pattern -> (kind, label, rank)
+    """
+    patterns = {MAMMO: ('mammo', '', 0)}
+    for kind, rules in [('birads', BIRADS_RULES), ('density', DENSITY_RULES)]:
+        for rank, (label, texts) in enumerate(rules):
+            for text in texts:
+                patterns.setdefault(text, (kind, label, rank))
+    return patterns
+
+PATTERNS = build_patterns()
+# Longer patterns first, so the regex reports the longest pattern starting at each position.
+# The lookahead reports overlapping hits starting at every position.
+MATCHER = re.compile('(?=(' + '|'.join(re.escape(text) for text in sorted(PATTERNS, key=len, reverse=True)) + '))')
+# The shorter patterns matching at the same position are the prefixes of the longest one (e.g. 'birads: 4' of 'birads: 4c').
+PREFIXES = {text: [other for other in PATTERNS if text.startswith(other)] for text in PATTERNS}
+
+
+def find_hits(reports):
+    """
+    Return every birads, density and mammo hit of every report.
+
+    Args:
+        reports (Series): radiology reports
+
+    Returns:
+        DataFrame: one row per hit (row, kind, label, rank, start, pattern). `row` is the position in `reports`
+    """
+    lowered = reports.fillna('').astype(str).str.lower()
+    hits = [(row, match.start(), pattern)
+            for row, text in enumerate(lowered)
+            for match in MATCHER.finditer(text)
+            for pattern in PREFIXES[match.group(1)]]
+    hits = pd.DataFrame(hits, columns=['row', 'start', 'pattern'])
+    rules = pd.DataFrame.from_dict(PATTERNS, orient='index', columns=['kind', 'label', 'rank'])
+    hits = hits.join(rules, on='pattern')
+    return hits[['row', 'kind', 'label', 'rank', 'start', 'pattern']]
+
+def _best_label(hits, kind, rules, size):
+    hits = hits.loc[hits['kind'] == kind]
+    best = np.full(size, len(rules))
+    np.minimum.at(best, hits['row'].to_numpy(dtype=int), hits['rank'].to_numpy(dtype=int))
+    labels = np.array([label for label, _ in rules] + [''], dtype=object)
+    return labels[best]
+
+def parse_reports(reports, hits=None):
+    """
+    Return the density and birads category of every report.
+
+    Args:
+        reports (Series): radiology reports
+        hits (DataFrame): hits from `find_hits`, if they were already computed
+
+    Returns:
+        DataFrame: 'density' and 'birads' columns with the index of `reports`
+    """
+    if hits is None:
+        hits = find_hits(reports)
+    size = len(reports)
+    mammo = np.zeros(size, dtype=bool)
+    mammo[hits.loc[hits['kind'] == 'mammo', 'row'].to_numpy()] = True
+    density = _best_label(hits, 'density', DENSITY_RULES, size)
+    density[~mammo] = ''
+    birads = _best_label(hits, 'birads', BIRADS_RULES, size)
+    return pd.DataFrame({'density': density, 'birads': birads}, index=reports.index)
@@ -0,0 +1,77 @@
+"""
+The module keeps report texts out of the DataFrames in an offset-indexed store.
+The texts are written one after another to a UTF-8 file, and their start offsets to a numpy index.
+Each report is identified by its position in the store (report_id), so only the id and the flags derived
+from the text travel through the joins. A text is read back only when it is requested, from a memory map.
+
+1. Write the texts and their offsets
+2. Read the texts of the requested report ids from the memory-mapped store
+
+Usage:
+    python report_store.py <store path> <report_id> [<report_id> ...]
+"""
+import argparse
+import mmap
+import numpy as np
+
+
+def text_path(path):
+    return path + '.txt'
+
+def index_path(path):
+    return path + '.idx.npy'
+
+def write_store(texts, path):
+    """
+    Write report texts to a store.
+
+    Args:
+        texts (Series or list): report texts (a missing text is stored as '')
+        path (str): store path without extension (e.g. BASE_DIR + '/medicom_reports')
+
+    Returns:
+        ndarray: report_id of each text (its position in the store)
+    """
+    offsets = [0]
+    with open(text_path(path), 'wb') as f:
+        for text in texts:
+            data = text.encode('utf-8') if isinstance(text, str) else b''
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(index_path(path), np.array(offsets, dtype=np.int64))
+    return np.arange(len(offsets) - 1, dtype=np.int32)
+
+def read_reports(path, report_ids):
+    """
+    Read the texts of some reports of a store. Only the requested texts are read from disk.
+
+    Args:
+        path (str): store path without extension
+        report_ids (list): report ids (NaN or a negative id gives '')
+
+    Returns:
+        list: report texts in the order of the ids
+    """
+    offsets = np.load(index_path(path), mmap_mode='r')
+    with open(text_path(path), 'rb') as f:
+        if offsets[-1] == 0:  # an empty file cannot be memory-mapped
+            return ['' for _ in report_ids]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            texts = []
+            for report_id in report_ids:
+                if report_id != report_id or report_id == '' or int(report_id) < 0:
+                    texts.append('')
+                    continue
+                report_id = int(report_id)
+                texts.append(data[offsets[report_id]:offsets[report_id + 1]].decode('utf-8'))
+    return texts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print reports of a report store.')
+    parser.add_argument('path', help='store path without extension')
+    parser.add_argument('report_ids', type=int, nargs='+')
+    args = parser.parse_args()
+    for report_id, text in zip(args.report_ids, read_reports(args.path, args.report_ids)):
+        print('#%d' % report_id)
+        print(text)
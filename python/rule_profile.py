@@ -0,0 +1,157 @@
+"""
+The module profiles the classification rules of the pipeline scripts: the time of each rule and the rows per branch.
+Row-wise rules (the `get` functions applied with `apply(axis=1)`) are run through `apply`: the rule runs once on the
+whole frame with a trace of its return statements, so each branch is counted by the line it returns from.
+Their time includes the trace, which sees every Python call of the run (marked 'traced' in the report).
+Column-wise rules are run through `call`, which times the rule and counts the rows per returned value.
+If the MEDICOM_RULE_PROFILE environment variable is set, one record per rule call is appended to that file as a JSON line,
+so the worker processes of a parallel run log into the same file. Otherwise the rules are called directly and nothing is measured.
+
+1. Time each rule on the whole frame
+2. Count the rows per branch (return line) or per returned value
+3. Report the hottest rules and their branches
+
+Usage:
+    MEDICOM_RULE_PROFILE=rules.jsonl python dicom_merge.py
+    python rule_profile.py rules.jsonl [--top 10]
+"""
+import argparse
+import collections
+import json
+import linecache
+import os
+import sys
+import time
+import pandas as pd
+
+PROFILE = os.environ.get('MEDICOM_RULE_PROFILE')  # read once, so a disabled profile costs one test per rule call
+MAX_VALUES = 20  # returned values counted per column-wise rule, the rest are counted as 'other'
+
+
+def enabled():
+    return bool(PROFILE)
+
+def _write(rule, rows, seconds, branches, traced=False):
+    record = {'module': rule.__module__, 'rule': rule.__name__, 'rows': rows, 'seconds': seconds, 'branches': branches,
+              'traced': traced}
+    with open(PROFILE, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def _traced_apply(df, rule):
+    # Only the frames of the rule are traced, and only their return events (no line events).
+    code = rule.__code__
+    hits = collections.Counter()
+    def on_return(frame, event, arg):
+        if event == 'return':
+            hits[frame.f_lineno] += 1
+        return on_return
+    def on_call(frame, event, arg):
+        if frame.f_code is not code:
+            return None
+        frame.f_trace_lines = False
+        return on_return
+    previous = sys.gettrace()
+    sys.settrace(on_call)
+    try:
+        result = df.apply(rule, axis=1)
+    finally:
+        sys.settrace(previous)
+    branches = {}
+    for line, count in hits.most_common():
+        source = linecache.getline(code.co_filename, line).strip()
+        # A rule that ends without a return statement returns None after its last evaluated line.
+        branches['%d: %s' % (line, source if source.startswith('return') else 'return None (after %s)' % source)] = count
+    return result, branches
+
+def _value_counts(result):
+    if isinstance(result, pd.DataFrame):
+        branches = {}
+        for column in result.columns:
+            branches.update({'%s = %s' % (column, value): count for value, count in _value_counts(result[column]).items()})
+        return branches
+    counts = pd.Series(result).astype(str).value_counts()
+    branches = {repr(value): int(count) for value, count in counts.iloc[:MAX_VALUES].items()}
+    if len(counts) > MAX_VALUES:
+        branches['other'] = int(counts.iloc[MAX_VALUES:].sum())
+    return branches
+
+def apply(df, rule):
+    """
+    Apply a row-wise rule, like `df.apply(rule, axis=1)`, and profile it if enabled.
+
+    Args:
+        df (DataFrame): rows
+        rule (function): row-wise rule
+
+    Returns:
+        Series: result of the rule per row
+    """
+    if not PROFILE:
+        return df.apply(rule, axis=1)
+    start = time.perf_counter()
+    result, branches = _traced_apply(df, rule)
+    seconds = time.perf_counter() - start
+    _write(rule, len(df), seconds, branches, traced=True)
+    return result
+
+def call(rule, *args, count=True):
+    """
+    Call a column-wise rule, like `rule(*args)`, and profile it if enabled.
+
+    Args:
+        rule (function): column-wise rule
+        args: arguments of the rule
+        count (bool): count the rows per returned value (False for text results)
+
+    Returns:
+        result of the rule
+    """
+    if not PROFILE:
+        return rule(*args)
+    start = time.perf_counter()
+    result = rule(*args)
+    seconds = time.perf_counter() - start
+    _write(rule, len(result), seconds, _value_counts(result) if count else {})
+    return result
+
+def summarize(records, top=10):
+    """
+    Print the rules by total time and the rows per branch of the hottest ones.
+
+    Args:
+        records (list): profile records
+        top (int): number of rules whose branches are printed
+    """
+    rules = {}
+    for record in records:
+        key = (record['module'], record['rule'])
+        total = rules.setdefault(key, {'calls': 0, 'rows': 0, 'seconds': 0.0, 'traced': False, 'branches': collections.Counter()})
+        total['calls'] += 1
+        total['traced'] |= record.get('traced', False)
+        total['rows'] += record['rows']
+        total['seconds'] += record['seconds']
+        total['branches'].update(record['branches'])
+    ranked = sorted(rules.items(), key=lambda item: -item[1]['seconds'])
+    overall = sum(total['seconds'] for total in rules.values()) or 1.0
+
+    print('%-16s %-30s %6s %9s %9s %8s %6s' % ('module', 'rule', 'calls', 'rows', 'seconds', 'us/row', 'share'))
+    for (module, rule), total in ranked:
+        per_row = total['seconds'] / total['rows'] * 1e6 if total['rows'] else 0.0
+        print('%-16s %-30s %6d %9d %8.3fs %8.2f %5.1f%%%s' % (module, rule, total['calls'], total['rows'], total['seconds'],
+                                                             per_row, 100 * total['seconds'] / overall,
+                                                             '  traced' if total['traced'] else ''))
+    for (module, rule), total in ranked[:top]:
+        if not total['branches']:
+            continue
+        print('\n%s.%s' % (module, rule))
+        for branch, count in total['branches'].most_common():
+            print('  %9d %5.1f%%  %s' % (count, 100 * count / max(total['rows'], 1), branch))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report the time and branch hits of the classification rules.')
+    parser.add_argument('path', help='rule profile written with MEDICOM_RULE_PROFILE')
+    parser.add_argument('--top', type=int, default=10, help='number of rules whose branches are printed')
+    args = parser.parse_args()
+    with open(args.path) as f:
+        summarize([json.loads(line) for line in f if line.strip()], args.top)
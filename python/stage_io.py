@@ -0,0 +1,260 @@
+"""
+The module reads the raw exports with declared schemas and writes and reads the intermediate files passed between the pipeline stages.
+Each raw export is read with only the columns its stage uses, low-cardinality tags and repeated patient and study ids
+as categoricals and numeric tags as floats.
+Each stage always writes a CSV for humans. Optionally it also writes a typed Feather(Arrow IPC) copy next to it,
+in which dates are datetime64, counts are int and low-cardinality labels are categoricals,
+so dicom_merge.py can memory-map only the columns it needs without parsing strings again.
+Text-heavy exports can also be read concurrently with the multithreaded Arrow CSV reader into Arrow-backed strings.
+pyarrow is only needed when the Feather copy is written or read, or an export is read with Arrow.
+
+1. Read a raw export with its declared columns and types (read_csv, only the rows of some keys, or Arrow for several exports at once)
+2. Convert the columns of a stage to the declared types
+3. Write the CSV and the Feather copy
+4. Read the Feather copy if it is up to date, otherwise the CSV (or pass the typed output in memory)
+"""
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# Raw exports. columns: columns read, numbers: float columns, categories: low-cardinality columns,
+# ids: identifiers repeated on every file of a patient or study, interned into a dictionary (categorical) when they are read
+INPUTS = {'dicom_meta': {'columns': ['Patient_ID', 'Study_Instance_UID', 'Manufacturer', 'Manufacturer_Model_Name', 'Study_Date',
+                                     'Study_Description', 'Patient_Sex', 'Patient_Birth_Date', 'SOP Instance UID',
+                                     'Frame of Reference UID', 'Series_Description', 'Number of Frames', 'Image Laterality',
+                                     'View Position', 'Rows', 'Columns', 'Window Center', 'Window Width', 'Presentation Intent Type',
+                                     'Estimated Radiographic Magnification Factor', 'Breast Implant Present',
+                                     'View Modifier Code Sequence Meaning', 'Plane Orientation', 'Path'],
+                         'numbers': ['Number of Frames', 'Rows', 'Columns', 'Estimated Radiographic Magnification Factor'],
+                         'categories': ['Manufacturer', 'Patient_Sex', 'Image Laterality', 'View Position', 'Presentation Intent Type',
+                                        'Breast Implant Present', 'View Modifier Code Sequence Meaning'],
+                         'ids': ['Patient_ID', 'Study_Instance_UID']},
+          'bx': {'columns': ['patientId', 'studyUID', 'completedDate', 'reports']},  # medicom_bx_a.csv, medicom_bx_b.csv
+          'bx_2': {'columns': ['Patient_ID', 'Representative_Study_Instance_UID', 'bx_report']},  # medicom_bx_a2.csv, medicom_bx_b2.csv
+          'bx_ge': {'columns': ['Patient ID', 'Index Exam Study UID', 'Biopsy Finding (Negative, Benign, Malignant)'],
+                    'categories': ['Biopsy Finding (Negative, Benign, Malignant)']},
+          'reports': {'columns': ['Study_Instance_UID', 'reports']}}
+
+# dates: column -> strptime format (None to infer), ints: integer columns, categories: low-cardinality columns
+# (left_label and right_label are free text from the biopsy reports, of unbounded cardinality, so they stay strings)
+SCHEMAS = {'dicom': {'dates': {'Study_Date': '%Y%m%d', 'Patient_Birth_Date': '%Y%m%d'},
+                     'ints': ['view_count'],
+                     'categories': ['Manufacturer', 'Manufacturer_Model_Name', 'Patient_Sex', 'group', 'scan_type', '4view_type']},
+           'biopsy_lt': {'dates': {'lt_bx_date': None},
+                         'categories': ['biopsy_side_lt']},
+           'biopsy_rt': {'dates': {'rt_bx_date': None},
+                         'categories': ['biopsy_side_rt']},
+           'report': {'ints': ['report_id'],
+                      'categories': ['birads', 'density']}}
+
+
+def feather_path(path):
+    """
+    Return the Feather path next to a CSV path (e.g. medicom_dicom_parsed.csv -> medicom_dicom_parsed.feather)
+    """
+    return os.path.splitext(path)[0] + '.feather'
+
+def add_blank(column):
+    """
+    Add '' to the categories of a categorical column, so `fillna('')` keeps working.
+    """
+    if '' in column.cat.categories:
+        return column
+    return column.cat.add_categories('')
+
+def _with_blank(df, schema):
+    for column in schema.get('categories', []) + schema.get('ids', []):
+        if column in df.columns:
+            df[column] = add_blank(df[column])
+    return df
+
+def read_input(path, source, chunksize=None, rows=None):
+    """
+    Read a raw export with its declared columns and types.
+    A value that is not a number in a numeric column fails the read, instead of turning the whole column into strings.
+
+    Args:
+        path (str): CSV path
+        source (str): a key of INPUTS
+        chunksize (int): if given, return an iterator of chunks of this many rows
+        rows (set): if given, only these rows are read (positions of the data rows from 0);
+            the parser skips the others without converting their values
+
+    Returns:
+        DataFrame (or iterator of DataFrames): the declared columns in the order of the file
+    """
+    schema = INPUTS[source]
+    columns = set(schema['columns'])
+    dtype = {column: 'float64' for column in schema.get('numbers', [])}
+    dtype.update({column: 'category' for column in schema.get('categories', []) + schema.get('ids', [])})
+    skiprows = None if rows is None else (lambda line: line > 0 and line - 1 not in rows)  # line 0 is the header
+    df = pd.read_csv(path, encoding='utf-8-sig', low_memory=False, usecols=lambda column: column in columns, dtype=dtype,
+                     chunksize=chunksize, skiprows=skiprows)
+    if chunksize:
+        return (_with_blank(chunk, schema) for chunk in df)
+    return _with_blank(df, schema)
+
+def read_input_rows(path, source, column, keys):
+    """
+    Read the rows of a raw export whose column value is in keys (e.g. the patients of a sample).
+    Only the column is read from every row; the declared columns are then read from the kept rows alone.
+
+    Args:
+        path (str): CSV path
+        source (str): a key of INPUTS
+        column (str): column filtered on (e.g. 'Patient_ID'), compared as strings
+        keys (set): values kept
+
+    Returns:
+        DataFrame: the kept rows with the declared columns and types, like read_input
+    """
+    values = pd.read_csv(path, encoding='utf-8-sig', usecols=[column], dtype=str)[column]
+    return read_input(path, source, rows=set(values.index[values.isin(keys)]))
+
+def read_input_arrow(path, source):
+    """
+    Read a raw export with its declared columns and types with the multithreaded Arrow CSV reader.
+    Quoted values may span several lines (the free-text reports). Text columns are returned as Arrow-backed strings
+    (string[pyarrow]) instead of one Python object per cell; missing values are the ones read_csv treats as NaN.
+
+    Args:
+        path (str): CSV path
+        source (str): a key of INPUTS
+
+    Returns:
+        DataFrame: the declared columns in the order of the file
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    from pandas._libs.parsers import STR_NA_VALUES
+
+    schema = INPUTS[source]
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader(f), [])
+    columns = [column for column in header if column in set(schema['columns'])]
+    numbers = schema.get('numbers', [])
+    types = {column: pa.float64() if column in numbers else pa.string() for column in columns}
+    table = pa_csv.read_csv(path, read_options=pa_csv.ReadOptions(use_threads=True),
+                            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                            convert_options=pa_csv.ConvertOptions(include_columns=columns, column_types=types,
+                                                                  null_values=sorted(STR_NA_VALUES), strings_can_be_null=True))
+    df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+    for column in schema.get('categories', []) + schema.get('ids', []):
+        if column in df.columns:
+            df[column] = df[column].astype(object).astype('category')  # sorted categories, like read_csv
+    return _with_blank(df, schema)
+
+def read_inputs(inputs, arrow=False):
+    """
+    Read several raw exports. With arrow, they are read at the same time on threads (the Arrow reader releases the GIL).
+
+    Args:
+        inputs (list): (path, source) of each export
+        arrow (bool): read with read_input_arrow instead of read_input
+
+    Returns:
+        list: DataFrames in the order of the inputs
+    """
+    if not arrow:
+        return [read_input(path, source) for path, source in inputs]
+    with ThreadPoolExecutor(max_workers=len(inputs)) as pool:
+        return list(pool.map(lambda item: read_input_arrow(*item), inputs))
+
+def _labels(column, categorical):
+    # Strings without missing values are kept, anything else becomes strings with '' for the missing values.
+    is_category = isinstance(column.dtype, pd.CategoricalDtype)
+    if column.hasnans or pd.api.types.infer_dtype(column.cat.categories if is_category else column, skipna=False) != 'string':
+        column, is_category = column.astype(object).fillna('').astype(str), False
+    if categorical:
+        # '' is always a category, so `fillna('')` after a left merge keeps working.
+        return add_blank(column if is_category else column.astype('category'))
+    return column.astype(object) if is_category else column
+
+def to_typed(df, stage, categorical=True):
+    """
+    Convert the columns of a stage to the types declared in SCHEMAS (the declared columns it has).
+    Only the columns whose type differs are converted; the others are shared with `df`, which is not modified.
+
+    Args:
+        df (DataFrame): stage output
+        stage (str): a key of SCHEMAS
+        categorical (bool): declared categories as categoricals, otherwise as strings
+
+    Returns:
+        DataFrame: typed stage output
+    """
+    schema = SCHEMAS[stage]
+    df = df.copy(deep=False)
+    for column, date_format in schema.get('dates', {}).items():
+        if column not in df.columns or pd.api.types.is_datetime64_any_dtype(df[column]):
+            continue
+        text = df[column].astype(str)
+        if date_format == '%Y%m%d':
+            text = text.str[:8]
+        df[column] = pd.to_datetime(text, format=date_format, errors='coerce')
+    for column in [column for column in schema.get('ints', []) if column in df.columns and df[column].dtype != 'int64']:
+        df[column] = pd.to_numeric(df[column], errors='coerce').fillna(0).astype('int64')
+    for column in [column for column in schema.get('categories', []) if column in df.columns]:
+        df[column] = _labels(df[column], categorical)
+    return df
+
+def write_stage(df, path, stage, feather=False):
+    """
+    Write the output of a stage as CSV and, if requested, as a typed Feather copy.
+
+    Args:
+        df (DataFrame): stage output
+        path (str): CSV path
+        stage (str): a key of SCHEMAS
+        feather (bool): also write the typed Feather copy
+    """
+    df.to_csv(path)
+    if feather:
+        from pyarrow import feather as pa_feather
+        # Uncompressed, so the file can be memory-mapped without decoding.
+        pa_feather.write_feather(to_typed(df, stage).reset_index(drop=True), feather_path(path), compression='uncompressed')
+
+def pass_stage(df, stage, columns=None, categorical=True):
+    """
+    Pass the output of a stage to the next one in memory: the same frame `read_stage` returns from the Feather copy,
+    without writing or parsing a file. Only the selected columns are copied, and only the declared columns
+    whose type differs are converted (with categorical=False, the declared categories are never made categoricals).
+
+    Args:
+        df (DataFrame): stage output
+        stage (str): a key of SCHEMAS
+        columns (list): columns to pass, all columns if None
+        categorical (bool): keep categorical columns, otherwise return them as strings
+
+    Returns:
+        DataFrame: typed stage output
+    """
+    df = to_typed(df if columns is None else df[columns], stage, categorical)
+    df.index = pd.RangeIndex(len(df))  # a shallow copy, the caller's index is kept
+    if not categorical:
+        for column in df.columns[df.dtypes == 'category']:
+            df[column] = df[column].astype(object)
+    return df
+
+def read_stage(path, columns=None, categorical=True):
+    """
+    Read the output of a stage. The Feather copy is used if it exists and is not older than the CSV.
+
+    Args:
+        path (str): CSV path
+        columns (list): columns to load, all columns if None
+        categorical (bool): keep categorical columns of the Feather copy, otherwise return them as strings
+
+    Returns:
+        DataFrame: stage output
+    """
+    typed_path = feather_path(path)
+    if os.path.exists(typed_path) and (not os.path.exists(path) or os.path.getmtime(typed_path) >= os.path.getmtime(path)):
+        from pyarrow import feather as pa_feather
+        df = pa_feather.read_table(typed_path, columns=columns, memory_map=True).to_pandas()
+        if not categorical:
+            for column in df.columns[df.dtypes == 'category']:
+                df[column] = df[column].astype(object)
+        return df
+    return pd.read_csv(path, encoding='utf-8-sig', low_memory=False, usecols=columns)
@@ -0,0 +1,159 @@
+"""
+The module records the wall time, rows and memory of each numbered step of the pipeline scripts.
+A script calls `mark` at the start of each step and `finish` at its end. A step ends when the next one starts,
+so the frame passed to `mark` is the output of the previous step and the input of the next one.
+If the MEDICOM_STEP_LOG environment variable is set, the records are appended to that file as JSON lines,
+so several scripts (or runs) can log into the same file. Otherwise nothing is written and the frames are not measured.
+If MEDICOM_STEP_FLAME is set, the step times are also appended there as folded stacks ('module;step microseconds'),
+the input of flamegraph.pl and speedscope.
+
+Usage:
+    python step_log.py steps.jsonl                 # time, rows and memory per step
+    python step_log.py steps.jsonl --flame out.txt # folded stacks of the records
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+records = []
+_current = {}
+
+
+def enabled():
+    return bool(os.environ.get('MEDICOM_STEP_LOG') or os.environ.get('MEDICOM_STEP_FLAME'))
+
+def peak_rss_kb():
+    """
+    Return the peak resident set size of this process in KB, None if it cannot be measured.
+    """
+    # On Linux ru_maxrss survives exec, so a script started by a larger process would report the parent's peak.
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # bytes on macOS, KB on Linux
+
+def measure(frames):
+    """
+    Return the rows and memory of one or several frames.
+
+    Args:
+        frames (DataFrame, list or None): frame, or frames whose rows and memory are summed
+
+    Returns:
+        tuple: rows, bytes (None, None if no frame is given)
+    """
+    if frames is None:
+        return None, None
+    if not isinstance(frames, (list, tuple)):
+        frames = [frames]
+    rows = sum(len(frame) for frame in frames)
+    memory = sum(int(frame.memory_usage(index=True, deep=True).sum()) for frame in frames)
+    return rows, memory
+
+def _end(module, stop, rows_out, bytes_out):
+    if module not in _current:
+        return
+    step, start, rows_in, bytes_in = _current.pop(module)
+    seconds = stop - start
+    records.append({'module': module,
+                    'step': step,
+                    'seconds': round(seconds, 6),
+                    'rows_in': rows_in,
+                    'rows_out': rows_out,
+                    'bytes_in': bytes_in,
+                    'bytes_out': bytes_out,
+                    'peak_rss_kb': peak_rss_kb()})
+
+def mark(module, step, frames=None):
+    """
+    Start a step of a module and end the previous one.
+
+    Args:
+        module (str): script name (e.g. medicom_dicom)
+        step (str): numbered step (e.g. '1. Remove the outliers')
+        frames (DataFrame or list): output of the previous step and input of this one, if any
+    """
+    # The clock stops before the frames are measured, and the next step starts after: the (deep) measure is charged to
+    # neither step, and is done once for the output of the previous step and the input of this one.
+    stop = time.perf_counter()
+    rows, memory = measure(frames) if enabled() else (None, None)
+    _end(module, stop, rows, memory)
+    _current[module] = (step, time.perf_counter(), rows, memory)
+
+def finish(module, frames=None):
+    """
+    End the last step of a module and write its records to MEDICOM_STEP_LOG and MEDICOM_STEP_FLAME.
+
+    Args:
+        module (str): script name
+        frames (DataFrame or list): output of the last step, if any
+    """
+    stop = time.perf_counter()
+    _end(module, stop, *(measure(frames) if enabled() else (None, None)))
+    module_records = [record for record in records if record['module'] == module]
+    # Written once: a second run in the same process (medicom_api) starts with no records of the module.
+    records[:] = [record for record in records if record['module'] != module]
+    path = os.environ.get('MEDICOM_STEP_LOG')
+    if path:
+        with open(path, 'a') as f:
+            for record in module_records:
+                f.write(json.dumps(record) + '\n')
+    path = os.environ.get('MEDICOM_STEP_FLAME')
+    if path:
+        write_folded(module_records, path)
+
+def write_folded(step_records, path):
+    """
+    Append the step times as folded stacks ('module;step microseconds'), one line per step.
+    """
+    with open(path, 'a') as f:
+        for record in step_records:
+            f.write('%s;%s %d\n' % (record['module'], record['step'].replace(';', ','), record['seconds'] * 1e6))
+
+def summarize(step_records):
+    """
+    Return a text table of the steps: time (with its share of the module), rows in and out, memory in and out.
+    """
+    lines = []
+    for module in dict.fromkeys(record['module'] for record in step_records):
+        steps = [record for record in step_records if record['module'] == module]
+        total = sum(record['seconds'] for record in steps) or 1
+        lines.append('%s %.2fs' % (module, total))
+        for record in steps:
+            share = record['seconds'] / total
+            lines.append('  %-40s %8.2fs %-20s %10s -> %-10s %8s -> %-8s' % (
+                record['step'], record['seconds'], '#' * round(share * 20),
+                _blank(record.get('rows_in')), _blank(record.get('rows_out')),
+                _mb(record.get('bytes_in')), _mb(record.get('bytes_out'))))
+    return '\n'.join(lines)
+
+def _blank(value):
+    return '' if value is None else value
+
+def _mb(size):
+    return '' if size is None else '%.1fMB' % (size / 2 ** 20)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize the step records written to MEDICOM_STEP_LOG.')
+    parser.add_argument('log', help='JSON lines file')
+    parser.add_argument('--flame', help='write the records as folded stacks to this file')
+    args = parser.parse_args()
+    with open(args.log) as f:
+        step_records = [json.loads(line) for line in f if line.strip()]
+    print(summarize(step_records))
+    if args.flame:
+        open(args.flame, 'w').close()
+        write_folded(step_records, args.flame)
@@ -0,0 +1,49 @@
+"""
+Checks that best_rows.best_per_key returns the same rows, in the same order, as
+`sort_values(...).drop_duplicates(...)`, on random frames with ties, missing values and mixed-type columns.
+
+Usage:
+    python -m pytest test_best_rows.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import best_rows
+
+ROWS = 300
+
+
+def random_frame(rng, rows):
+    # Few distinct values, so keys and ranks tie often; every column has missing values.
+    numbers = rng.choice([1.0, 2.0, 10.0, np.nan], size=rows)
+    texts = rng.choice(np.array(['a', 'B', 'b', '', '10', '2', None], dtype=object), size=rows)
+    mixed = rng.choice(np.array([1.0, 2.0, 10.0, '', 'x', '2', np.nan], dtype=object), size=rows)  # e.g. frame counts and ''
+    return pd.DataFrame({'key': rng.choice(np.array(['p1', 'p2', 'p10', 'p3', None], dtype=object), size=rows),
+                         'number_key': rng.choice([3.0, 1.0, 20.0, np.nan], size=rows),
+                         'number': numbers,
+                         'integer': rng.integers(0, 3, size=rows),
+                         'text': texts,
+                         'mixed': pd.Series(mixed, dtype=object),
+                         'category': pd.Categorical(rng.choice(['high', 'low', 'mid'], size=rows), categories=['low', 'mid', 'high'])},
+                        index=rng.permutation(rows) * 7)
+
+def expected(df, key, ranks, ascending, keep):
+    return df.sort_values(by=[key] + ranks, ascending=ascending).drop_duplicates(subset=[key], keep=keep)
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_same_as_sort_and_drop_duplicates(seed):
+    rng = np.random.default_rng(seed)
+    df = random_frame(rng, ROWS)
+    columns = ['number', 'integer', 'text', 'mixed', 'category']
+    for key in ['key', 'number_key']:
+        for keep in ['first', 'last']:
+            ranks = list(rng.choice(columns, size=rng.integers(1, 4), replace=False))
+            for ascending in [True, False, list(rng.random(len(ranks) + 1) < 0.5)]:
+                result = best_rows.best_per_key(df, key, ranks, ascending, keep)
+                pd.testing.assert_frame_equal(result, expected(df, key, ranks, ascending, keep))
+
+def test_mixed_column_ranks_numbers_first():
+    column = pd.Series([10.0, '', 2.0, 'x', None], dtype=object)
+    assert list(best_rows.rank_values(column)) == [1, 2, 0, 3, np.inf]
+    assert list(best_rows.rank_values(column, ascending=False)) == [2, 1, 3, 0, np.inf]
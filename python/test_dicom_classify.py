@@ -0,0 +1,219 @@
+"""
+Checks that dicom_classify returns the same values as the row-wise rules it replaced (kept below as the reference),
+on randomized dicom meta rows that reach every branch.
+
+Usage:
+    python -m pytest test_dicom_classify.py
+"""
+import ast
+import numpy as np
+import pandas as pd
+import dicom_classify
+
+ROWS = 5000
+
+
+# Row-wise rules of medicom_dicom.py before dicom_classify, the reference of the test.
+
+def get_scan_type(df):
+    """
+    Return the dicom's scan type(e.g. 3D, S2D or 2D)
+
+    Args:
+        dicom_metas (list): a list of dicom meta dict
+
+    Returns:
+        str: scan type
+    """    
+    try:
+        num_frame = int(df['Number of Frames'])
+    except ValueError:
+        num_frame = 0
+    series_description = df['Series_Description']
+    if num_frame > 1:
+        return "3D"
+    elif 'tomosynthesis' in series_description.lower() or 'ROUTINE3D_VOL' in series_description:
+        return "3D"
+    elif 'preview' in series_description.lower() or \
+            'c-view' in series_description.lower():
+        return "S2D"
+    else:
+        if df['Window Center'] == '' or df['Window Width'] == '':
+            return "unused"
+        else:
+            return "2D"
+
+def get_view_type(df):
+    """
+    Find out the view type(e.g. RCC) from GE 2D case. Unlike others,
+    view type cannot be parsed from the series description, so it utilizes
+    the laterality and view position information and plane_orientation in dicom meta.
+
+    Args:
+        dicom_meta (dict): dicom meta
+
+    Returns:
+        str: view type(e.g. LMLO)
+    """   
+    sereis_description = df['Series_Description']
+    laterality = df['Image Laterality']
+    view_position = df['View Position']
+    plane_orientation = df['Plane Orientation'].replace("'","")
+    views = ['XCCL','XCCM','CC','MLO','LMO','ML','LM']
+    for view in views:
+        if '_R2' in sereis_description:  # There is no dicom 
+            return ''
+        elif view in sereis_description:
+            return laterality + view
+    if '2D_PROC' in sereis_description:
+        return laterality + view_position
+    elif 'V-Preview' in sereis_description :
+        if plane_orientation:
+            plane_orientation = ast.literal_eval(plane_orientation)
+        else:
+            return ''
+        laterality = 'R' if int(plane_orientation[1]) == 1 else 'L'
+        if abs(plane_orientation[3]) > 1.0:
+            return ''
+        elif abs(plane_orientation[3]) >= 0.9:
+            view_position = 'CC'
+        elif abs(plane_orientation[3]) < 0.9:
+            view_position = 'MLO'
+        return laterality + view_position
+    else:
+        return ''
+
+def sum_rows_columns(df):
+    """
+    Return Sum of the Rows and Columns values.
+    If one study has multiple duplicate view files, 
+    the sum of rows and columns will be used as an element to select one file
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        int: sum of Rows and Columns (e.g. 4016)
+    """   
+    if df['Rows'] != '' and df['Columns'] != '' :
+        return int(df['Rows']) + int(df['Columns']) 
+
+def inter_view_type(df):
+    """
+    Return the 4-view type
+
+    Args:
+        dicom_meta (dict): dicom meta
+
+    Returns:
+        str: the 4-view type
+    """   
+    view_type = df['view_type']
+    LCC = 'LCC|LXCCL|LXCCM'
+    RCC = 'RCC|RXCCL|RXCCM'
+    LMLO = 'LMLO|LLM|LML|LLMO'
+    RMLO = 'RMLO|RLM|RML|RLMO'
+
+    if view_type != '':
+        if view_type in LCC :
+            return 'LCC'
+        elif view_type in RCC :
+            return 'RCC'
+        elif view_type in LMLO :
+            return 'LMLO'
+        elif view_type in RMLO :
+            return 'RMLO'
+        else:
+            return ''
+
+def get_view_priority(df):
+    """
+    Returns the view priority.
+    Standard 4-view and additional view take precedence over standard 4-view.
+
+    Args:
+        dicom_meta (dict): dicom meta
+
+    Returns:
+        int: 1 or 2
+    """   
+    view_type = df['view_type']
+    first = 'LCC|RCC|LMLO|RMLO'
+
+    if view_type != '' :
+        if view_type in first :
+            return int(2)  # To select standard 4-view by applying Ascending = "False"
+        else:
+            return int(1)
+
+def get_group(df):
+    """
+    Return group information
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: a single letter group name or ''
+    """   
+    path = df['Path']
+
+    if 'Group A' in path:
+        return 'A'
+    elif 'Group B' in path:
+        return 'B'
+    elif 'Group C' in path:
+        return 'C'
+    elif 'Group D' in path:
+        return 'D'
+    else :
+        return ''
+
+
+def random_meta(rows, seed):
+    """
+    Return random dicom meta rows as medicom_dicom reads them (numbers as floats, missing values filled with '').
+    """
+    rng = np.random.default_rng(seed)
+    def pick(values):
+        return [values[i] for i in rng.integers(len(values), size=rows)]
+    descriptions = ['Tomosynthesis Projection', 'ROUTINE3D_VOL', 'L CC C-View', 'V-Preview', 'R MLO Preview', '2D_PROC',
+                    'R XCCL', 'L XCCM', 'R CC', 'L MLO', 'R LMO', 'L ML', 'R LM', 'CC_R2', 'MLO_R2', 'Screening', '', 'spot']
+    orientations = ["['1', '0', '0', '0', '0', '-1']", "['0', '1', '0', '0.95', '0', '-1']", "['0', '-1', '0', '0.5', '0', '-1']",
+                    "[0, 1.0, 0, -0.2, 0, -1]", "['1', '1', '0', '1.5', '0', '-1']", "['0', '1', '0', '-0.9', '0', '1']", '']
+    return pd.DataFrame({'Path': pick(['/data/disk1/Group %s/p/s/1.dcm' % group for group in 'ABCDE'] + ['/data/other/1.dcm']),
+                         'Number of Frames': pick([1.0, 2.0, 60.0, 0.0, '']),
+                         'Series_Description': pick(descriptions),
+                         'Window Center': pick(['', '2047', 2047.0]),
+                         'Window Width': pick(['', '4095', 4095.0]),
+                         'Image Laterality': pick(['L', 'R', '']),
+                         'View Position': pick(['CC', 'MLO', 'XCCL', 'ML', 'SIO', '']),
+                         'Plane Orientation': pick(orientations),
+                         'Rows': pick([3328.0, 2294.0, 4096.0, '']),
+                         'Columns': pick([2560.0, 1914.0, 3328.0, ''])})
+
+def assert_same(vectorized, rowwise):
+    vectorized = pd.Series(vectorized, dtype=object).where(pd.notna(pd.Series(vectorized, dtype=object)), None)
+    rowwise = pd.Series(list(rowwise), dtype=object).where(pd.notna(pd.Series(list(rowwise), dtype=object)), None)
+    different = [(i, a, b) for i, (a, b) in enumerate(zip(vectorized, rowwise)) if a != b]
+    assert not different, different[:5]
+
+
+def test_classify_views_matches_rowwise_rules():
+    for seed in range(3):
+        df = random_meta(ROWS, seed)
+        classified = dicom_classify.classify_views(df)
+        view_type = df.apply(get_view_type, axis=1)
+        assert_same(classified['group'], df.apply(get_group, axis=1))
+        assert_same(classified['scan_type'], df.apply(get_scan_type, axis=1))
+        assert_same(classified['view_type'], view_type)
+        rows = pd.DataFrame({'view_type': view_type})
+        assert_same(classified['4view_type'], rows.apply(inter_view_type, axis=1))
+        assert_same(classified['view_priority'], rows.apply(get_view_priority, axis=1))
+        assert_same(classified['resolution'], df.apply(sum_rows_columns, axis=1))
+
+def test_random_meta_reaches_every_branch():
+    classified = dicom_classify.classify_views(random_meta(ROWS, 0))
+    assert set(classified['scan_type']) == {'3D', 'S2D', '2D', 'unused'}
+    assert set(classified['group']) == {'A', 'B', 'C', 'D', ''}
+    assert {'LCC', 'RCC', 'LMLO', 'RMLO', '', None} <= set(classified['4view_type'])
@@ -0,0 +1,83 @@
+"""
+Checks the meta rows dicom_crawl reads from DICOM files written with pydicom: the export columns, the view modifier
+and plane orientation sequences, and files that are skipped (not DICOM, malformed) without stopping the crawl.
+
+Usage:
+    python -m pytest test_dicom_crawl.py
+"""
+import os
+import pytest
+import dicom_crawl
+
+pydicom = pytest.importorskip('pydicom')
+
+
+def write_dicom(path, **tags):
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.1.2'  # Digital Mammography X-Ray Image Storage
+    meta.MediaStorageSOPInstanceUID = tags.get('SOPInstanceUID', generate_uid())
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    dataset = Dataset()
+    dataset.file_meta = meta
+    dataset.SOPClassUID = meta.MediaStorageSOPClassUID
+    for keyword, value in tags.items():
+        setattr(dataset, keyword, value)
+    dataset.BitsAllocated = 16
+    dataset.PixelData = b'\0' * 8
+    dataset.save_as(path, enforce_file_format=True)
+
+def code(meaning):
+    from pydicom.dataset import Dataset
+    item = Dataset()
+    item.CodeMeaning = meaning
+    return item
+
+
+@pytest.fixture
+def files(tmp_path):
+    from pydicom.dataset import Dataset
+
+    os.makedirs(tmp_path / 'a')
+    write_dicom(str(tmp_path / 'a' / '1.dcm'), PatientID='P1', StudyInstanceUID='1.2.3', Manufacturer='HOLOGIC, Inc.',
+                StudyDate='20200102', PatientSex='F', SOPInstanceUID='1.2.3.4', SeriesDescription='L CC', ImageLaterality='L', ViewPosition='CC',
+                Rows=4, Columns=2, WindowCenter=['1500', '2000'], WindowWidth=['500', '600'],
+                ImageOrientationPatient=['0', '1', '0', '0', '0', '-1'])
+    view = code('cranio-caudal')
+    view.ViewModifierCodeSequence = [code('spot compression')]
+    plane = Dataset()
+    plane.ImageOrientationPatient = ['1', '0', '0', '0', '1', '0']
+    group = Dataset()
+    group.PlaneOrientationSequence = [plane]
+    write_dicom(str(tmp_path / 'a' / '2.dcm'), PatientID='P1', StudyInstanceUID='1.2.3', SOPInstanceUID='1.2.3.5',
+                NumberOfFrames=50, ViewPosition='MLO', ViewCodeSequence=[view], SharedFunctionalGroupsSequence=[group],
+                ImageOrientationPatient=['0', '1', '0', '0', '0', '-1'])
+    (tmp_path / 'a' / 'notes.txt').write_text('not a dicom file')
+    write_dicom(str(tmp_path / 'b.dcm'), PatientID='P2', StudyInstanceUID='1.2.4', SOPInstanceUID='1.2.4.1', Rows=4)
+    rows = b'\x28\x00\x10\x00US\x02\x00'  # (0028,0010) Rows, US of 2 bytes
+    data = (tmp_path / 'b.dcm').read_bytes().replace(rows + b'\x04\x00', rows[:-2] + b'\x03\x00\x04\x00\x00')
+    (tmp_path / 'b.dcm').write_bytes(data)  # malformed: a US value of 3 bytes
+    return tmp_path
+
+
+def test_read_meta(files, capsys):
+    df = dicom_crawl.read_meta(str(files), workers=2)
+    assert list(df.columns) == dicom_crawl.COLUMNS
+    assert list(df['Path']) == [str(files / 'a' / '1.dcm'), str(files / 'a' / '2.dcm')]
+
+    first, second = df.to_dict('records')
+    assert first['Patient_ID'] == 'P1' and first['Study_Date'] == '20200102' and first['Image Laterality'] == 'L'
+    assert first['Rows'] == 4 and first['Window Center'] == '1500\\2000'
+    assert first['Number of Frames'] == '' and first['Patient_Birth_Date'] == ''
+    assert first['View Modifier Code Sequence Meaning'] == ''
+    assert first['Image Orientation Patient'] == '0\\1\\0\\0\\0\\-1'
+    assert first['Plane Orientation'] == "['0', '1', '0', '0', '0', '-1']"
+
+    assert second['Number of Frames'] == 50 and second['View Position'] == 'MLO'
+    assert second['View Modifier Code Sequence Meaning'] == 'spot compression'
+    assert second['Plane Orientation'] == "['1', '0', '0', '0', '1', '0']"  # the shared functional group comes first
+
+    errors = capsys.readouterr().err
+    assert str(files / 'a' / 'notes.txt') in errors and str(files / 'b.dcm') in errors
@@ -0,0 +1,214 @@
+"""
+Checks that merge_dates returns the same exam types, interval days and interval categories as the row-wise rules
+it replaced (kept below as the reference), on randomized merged studies with missing dates, biopsy times of day
+and both breasts labelled (the `fall_through` path of get_governing_biopsies).
+
+Usage:
+    python -m pytest test_merge_dates.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import merge_dates
+
+ROWS = 4000
+
+
+# Row-wise rules of dicom_merge.py step 7 before merge_dates, the reference of the test.
+
+def get_index_type(dicom):
+    """
+    Returns the index type
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: index type
+    """
+    study_date = dicom['Study_Date']
+    index_date = dicom['index_date']
+    group = dicom['group']
+    lt_bx_date = dicom['lt_bx_date']
+    rt_bx_date = dicom['rt_bx_date']
+    left_label = dicom['left_label']
+    right_label = dicom['right_label']
+    study_date = dicom['Study_Date']
+
+
+    if study_date == index_date :
+        return '1-index'
+    elif study_date < index_date :
+        return '2-pre_index'
+    elif study_date > index_date : 
+        return '3-post_index'
+    else:
+        if group == 'A':
+            if 'malignant' in left_label and 'malignant' in right_label:
+                if lt_bx_date >= rt_bx_date:
+                    if lt_bx_date > study_date:
+                        return '4-pre_bx'
+                    else:
+                        return '5-post_bx'
+                elif lt_bx_date < rt_bx_date:
+                    if rt_bx_date > study_date:
+                        return '4-pre_bx'
+                    else:
+                        return '5-post_bx'
+            elif 'malignant' in left_label and 'malignant' not in right_label:
+                if lt_bx_date > study_date:
+                    return '4-pre_bx'
+                else:
+                    return '5-post_bx'
+            elif 'malignant' in right_label and 'malignant' not in left_label:
+                if rt_bx_date > study_date:
+                    return '4-pre_bx'
+                else:
+                    return '5-post_bx'
+
+        if group == 'B':
+            benigns = ['benign', 'high risk']
+            for benign in benigns:
+                if benign in left_label and benign in right_label : 
+                    if lt_bx_date >= rt_bx_date:
+                        if lt_bx_date > study_date:
+                            return '4-pre_bx'
+                        else:
+                            return '5-post_bx'
+                    elif lt_bx_date < rt_bx_date:
+                        if rt_bx_date > study_date:
+                            return '4-pre_bx'
+                        else:
+                            return '5-post_bx'
+                elif benign in left_label and benign not in right_label :
+                    if lt_bx_date > study_date:
+                        return '4-pre_bx'
+                    else:
+                        return '5-post_bx'
+                elif benign in right_label and benign not in left_label :
+                    if rt_bx_date > study_date:
+                        return '4-pre_bx'
+                    else:
+                        return '5-post_bx'
+
+def get_index_interval_day(dicom):
+    """
+    Returns the time interval between index study and study date
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        day: time interval 
+    """
+    index_interval_day = dicom['index_interval_day']
+    group = dicom['group']
+    study_date = dicom['Study_Date']
+    lt_bx_date = dicom['lt_bx_date']
+    rt_bx_date = dicom['rt_bx_date']
+    left_label = dicom['left_label']
+    right_label = dicom['right_label']
+    study_date = dicom['Study_Date']
+
+
+    if index_interval_day != '' :
+        return index_interval_day
+    else:
+        if group == 'A':
+            if 'malignant' in left_label and 'malignant' in right_label:
+                if lt_bx_date >= rt_bx_date:
+                    return (study_date - lt_bx_date).days
+                else:
+                    return (study_date - rt_bx_date).days
+            elif 'malignant' in left_label and 'malignant' not in right_label:
+                return (study_date - lt_bx_date).days
+            elif 'malignant' in right_label and 'malignant' not in left_label:
+                return (study_date - rt_bx_date).days
+
+        if group == 'B':
+            benigns = ['benign', 'high risk']
+            for benign in benigns:
+                if benign in left_label and benign in right_label : 
+                    if lt_bx_date >= rt_bx_date:
+                        return (study_date - lt_bx_date).days
+                    else:
+                        return (study_date - rt_bx_date).days
+                elif benign in left_label and benign not in right_label :
+                    return (study_date - lt_bx_date).days
+                elif benign in right_label and benign not in left_label :
+                    return (study_date - rt_bx_date).days
+
+def get_index_interval_category(dicom):
+    """
+    Returns the time interval category from 1 to 5_over
+
+    Args:
+        dicom_meta (list): dicom meta
+
+    Returns:
+        str: time interval category
+    """
+    index_interval_day = abs(dicom['index_interval_day'])
+
+    if index_interval_day == 0:
+        return 0
+    elif index_interval_day > 0 and index_interval_day <= 365 :
+        return 1
+    elif index_interval_day > 365 and index_interval_day <= 730 :
+        return 2
+    elif index_interval_day > 730 and index_interval_day <= 1095 :
+        return 3
+    elif index_interval_day > 1095 and index_interval_day <= 1460 :
+        return 4
+    elif index_interval_day > 1460 and index_interval_day <= 1825 :
+        return 5
+    else:
+        return '5_over'
+
+
+def random_dates(rng, size, missing, time_of_day=False):
+    days = rng.integers(0, 8 * 365, size=size)
+    dates = pd.Timestamp('2014-01-01') + pd.to_timedelta(days, unit='D')
+    if time_of_day:  # biopsy dates carry a time of day
+        dates = dates + pd.to_timedelta(rng.integers(0, 86400, size=size), unit='s')
+    return pd.Series(dates).where(rng.random(size) >= missing)
+
+def random_studies(rows, seed):
+    # Few distinct dates, so the study, index and biopsy dates are often equal; labels often on both breasts.
+    rng = np.random.default_rng(seed)
+    labels = np.array(['malignant', 'benign', 'high risk', 'benign, high risk', 'malignant, benign', ''], dtype=object)
+    study = random_dates(rng, rows, 0.05)
+    index = study.where(rng.random(rows) < 0.3, random_dates(rng, rows, 0.5))
+    lt_bx = study.where(rng.random(rows) < 0.1, random_dates(rng, rows, 0.2, time_of_day=True))
+    rt_bx = lt_bx.where(rng.random(rows) < 0.1, random_dates(rng, rows, 0.2, time_of_day=True))
+    return pd.DataFrame({'group': rng.choice(['A', 'B', 'C', 'D'], size=rows),
+                         'Study_Date': study, 'index_date': index, 'lt_bx_date': lt_bx, 'rt_bx_date': rt_bx,
+                         'left_label': rng.choice(labels, size=rows), 'right_label': rng.choice(labels, size=rows)})
+
+def reference(dicom):
+    # Step 7 as dicom_merge.py ran it, the missing dates kept as NaT (the interval rule reads them as well)
+    dicom = dicom.copy()
+    exam_type = dicom.apply(get_index_type, axis=1).fillna('')
+    dicom['index_interval_day'] = (dicom['Study_Date'] - dicom['index_date']).dt.days.fillna('')
+    days = dicom.apply(get_index_interval_day, axis=1).astype(float)
+    categories = pd.DataFrame({'index_interval_day': days}).apply(get_index_interval_category, axis=1)
+    return exam_type, days, categories
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_same_as_row_wise_rules(seed):
+    dicom = random_studies(ROWS, seed)
+    exam_type, days, categories = reference(dicom)
+    assert list(merge_dates.get_index_types(dicom, merge_dates.get_governing_biopsies(dicom))) == list(exam_type)
+    interval = merge_dates.get_index_interval_days(dicom, merge_dates.get_governing_biopsies(dicom, fall_through=False))
+    np.testing.assert_array_equal(interval, days.to_numpy())
+    assert list(merge_dates.get_index_interval_categories(interval)) == list(categories)
+
+def test_random_studies_reach_every_exam_type_and_category():
+    dicom = random_studies(ROWS, 0)
+    exam_type, _, categories = reference(dicom)
+    assert set(exam_type) == {'1-index', '2-pre_index', '3-post_index', '4-pre_bx', '5-post_bx', ''}
+    assert set(categories.astype(str)) == {'0', '1', '2', '3', '4', '5', '5_over'}
+    # Both breasts labelled with a missing date: the exam type falls through to the next label, the interval does not.
+    both = dicom['left_label'].str.contains('benign') & dicom['right_label'].str.contains('benign') & (dicom['group'] == 'B')
+    assert (both & (dicom['lt_bx_date'].isna() | dicom['rt_bx_date'].isna())).any()
@@ -0,0 +1,54 @@
+"""
+Checks that merging again some patients and splicing them into the previous merged output (merge_incremental)
+gives the full merged output, rows and order, on a synthetic cohort (medicom_synth).
+
+Usage:
+    python -m pytest test_merge_incremental.py
+"""
+import pandas as pd
+import pytest
+import medicom_api
+import medicom_bx
+import medicom_report
+import medicom_synth
+import merge_incremental
+import stage_io
+
+SCALE = 0.1  # 100 patients
+
+
+@pytest.fixture(scope='module')
+def parsed(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('medicom'))
+    medicom_synth.generate(directory, scale=SCALE)
+    raw_dir = directory + '/raw_file'
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(medicom_bx, 'PARSE_CACHE', None)
+        patch.setattr(medicom_report, 'PARSE_CACHE', None)
+        dicom = medicom_api.parse_dicom(stage_io.read_input(raw_dir + '/medicom_dm_1_6.csv', 'dicom_meta'))
+        biopsy = [stage_io.read_input(raw_dir + '/' + path.rsplit('/', 1)[1], source) for path, source in medicom_bx.INPUT_FILES]
+        biopsy_lt, biopsy_rt = medicom_api.parse_biopsy(biopsy)
+        report = medicom_api.parse_report(stage_io.read_input(raw_dir + '/medicom_reports.csv', 'reports'),
+                                          store=directory + '/medicom_report_texts')
+    # Short ids that are prefixes of each other ('1', '10', '100'), where the order of the merge differs from the order of the ids.
+    ids = {patient: str(k) for k, patient in enumerate(pd.unique(dicom['Patient_ID'].astype(str)))}
+    dicom['Patient_ID'] = dicom['Patient_ID'].astype(str).map(ids)
+    for biopsy in (biopsy_lt, biopsy_rt):
+        biopsy['patientId'] = biopsy['patientId'].astype(str).map(ids).fillna('unknown')
+    return directory, dicom, biopsy_lt, biopsy_rt, report
+
+
+def test_splice_equals_full_merge(parsed):
+    directory, dicom, biopsy_lt, biopsy_rt, report = parsed
+    full = medicom_api.merge(dicom, biopsy_lt, biopsy_rt, report, workers=1)
+    merged_path = directory + '/medicom_merged.csv'
+    full.to_csv(merged_path)
+
+    patients = set(dicom['Patient_ID'].iloc[::3])
+    merged = medicom_api.merge(*merge_incremental.restrict(patients, dicom, biopsy_lt, biopsy_rt, report), workers=1)
+    spliced = merge_incremental.splice(merged_path, merged, patients)
+
+    assert spliced.to_csv() == full.reset_index(drop=True).to_csv()
+    # The ids are ordered differently by themselves, so the test would catch a splice ordered by Patient_ID.
+    by_patient = spliced.sort_values(['Group', 'Patient_ID', 'Scan_Type'], kind='stable').reset_index(drop=True)
+    assert by_patient.to_csv() != spliced.to_csv()
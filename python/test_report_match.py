@@ -0,0 +1,126 @@
+"""
+Checks that report_match returns the same hits and labels as the per-pattern loop and the if-chains it replaced
+(kept below as the reference), on randomized reports with overlapping patterns, the synthetic reports and
+the sample reports (if the raw files are present).
+
+Usage:
+    python -m pytest test_report_match.py
+"""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import medicom_report
+import medicom_synth
+import report_match
+
+ROWS = 3000
+
+
+# get_density and get_birads of medicom_report.py before report_match, the reference of the test.
+
+def get_density(report):
+
+    reports = report['reports'].lower()
+
+    if 'mammo' in reports :
+        if 'extremely dense' in reports :
+            return 'D'
+        elif 'heterogeneously dense' in reports:
+            return 'C'
+        elif 'scattered fibroglandular' in reports :
+            return 'B'
+        elif 'entirely fatty' in reports or 'predominantly fatty' in reports :
+            return 'A'
+        else:
+            return ''
+    else:
+        return ''
+
+def get_birads(report):
+
+    reports = report['reports'].lower()
+
+    if 'birads: 6' in reports or 'category: 6' in reports or 'category 6' in reports:
+        return '6'
+    elif 'birads: 5' in reports or 'category: 5' in reports or 'category 5' in reports :
+        return '5'
+    elif 'birads: 4c' in reports or 'category: 4c' in reports or 'category 4c' in reports :
+        return '4c'
+    elif 'birads: 4b' in reports or 'category: 4b' in reports or 'category 4b' in reports :
+        return '4b'
+    elif 'birads: 4a' in reports or 'category: 4a' in reports or 'category 4a' in reports :
+        return '4a'
+    elif 'birads: 4' in reports or 'category: 4' in reports or 'category 4' in reports :
+        return '4'
+    elif 'birads: 3' in reports or 'category: 3' in reports or 'category 3' in reports :
+        return '3'
+    elif 'birads: 2' in reports or 'category: 2' in reports or 'category 2' in reports :
+        return '2'
+    elif 'birads: 1' in reports or 'category: 1' in reports or 'category 1' in reports :
+        return '1'
+    elif 'birads: 0' in reports or 'category: 0' in reports or 'category 0' in reports :
+        return '0'
+    elif ': - benign' in reports:
+        return '2'
+    elif ': - probably benign' in reports:
+        return '2'
+    elif ': - negative' in reports:
+        return '1'
+    else:
+        return ''
+
+def loop_hits(reports):
+    # Every occurrence of every pattern, one str.find loop per pattern (overlapping occurrences included).
+    hits = set()
+    for row, text in enumerate(reports.fillna('').astype(str).str.lower()):
+        for pattern in report_match.PATTERNS:
+            start = text.find(pattern)
+            while start != -1:
+                hits.add((row, start, pattern))
+                start = text.find(pattern, start + 1)
+    return hits
+
+
+def random_reports(rows, seed):
+    # Patterns glued to each other, to filler, cut short or in another case, so hits overlap and share positions.
+    rng = np.random.default_rng(seed)
+    fragments = list(report_match.PATTERNS) + ['birads: 4c', 'category: 4a', 'category 4', ': - ', 'c', 'a', '0', ' ',
+                                               'Category', 'BIRADS: ', 'no ', 'mammogram', '\n', 'dense']
+    reports = []
+    for _ in range(rows):
+        parts = rng.choice(fragments, size=rng.integers(0, 8))
+        parts = [part[:rng.integers(1, len(part) + 1)] if rng.random() < 0.2 else part for part in parts]
+        parts = [part.upper() if rng.random() < 0.2 else part for part in parts]
+        reports.append(''.join(parts))
+    return pd.Series(reports + [None], dtype=object)
+
+def synthetic_reports(seed):
+    rng = np.random.default_rng(seed)
+    studies = medicom_synth.make_studies(rng, medicom_synth.make_patients(rng, 200))
+    return medicom_synth.make_reports(rng, studies)['reports'].reset_index(drop=True)
+
+def assert_same(reports):
+    hits = report_match.find_hits(reports)
+    assert set(hits[['row', 'start', 'pattern']].itertuples(index=False, name=None)) == loop_hits(reports)
+    parsed = report_match.parse_reports(reports)
+    frame = pd.DataFrame({'reports': reports.fillna('').astype(str)})
+    assert list(parsed['density']) == list(frame.apply(get_density, axis=1))
+    assert list(parsed['birads']) == list(frame.apply(get_birads, axis=1))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_random_reports(seed):
+    assert_same(random_reports(ROWS, seed))
+
+def test_synthetic_reports():
+    assert_same(synthetic_reports(0))
+
+@pytest.mark.skipif(not os.path.exists(medicom_report.INPUT_CSV), reason='sample reports not present')
+def test_sample_reports():
+    reports = pd.read_csv(medicom_report.INPUT_CSV, encoding='utf-8-sig', usecols=['reports'])['reports']
+    assert_same(reports)
+
+def test_shorter_pattern_at_the_same_position():
+    hits = report_match.find_hits(pd.Series(['birads: 4c']))
+    assert set(hits['pattern']) == {'birads: 4c', 'birads: 4'}